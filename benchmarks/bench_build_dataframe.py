@@ -0,0 +1,54 @@
+"""
+Benchmark of the datarequests response decoder against the previous per-element implementation.
+
+Run with `pytest benchmarks/bench_build_dataframe.py` (requires pytest-benchmark).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from lxml import etree
+
+from pylim import limutils
+
+
+def legacy_build_dataframe(reports) -> pd.DataFrame:
+    columns = [x.text for x in reports.iter(tag='ColumnHeadings')]
+    dates = [x.text for x in reports.iter(tag='RowDates')]
+    if len(columns) == 0 or len(dates) == 0:
+        return
+
+    values = [float(x.text) for x in reports.iter(tag='Values')]
+    values = list(limutils.alternate_col_val(values, len(columns)))
+
+    df = pd.DataFrame(values, columns=columns, index=pd.to_datetime(dates))
+    return df
+
+
+def make_reports(rows: int = 30 * 260, cols: int = 20):
+    dates = pd.bdate_range('1990-01-01', periods=rows)
+    values = np.random.default_rng(0).random((rows, cols)) * 100
+    parts = ['<DataRequestResponse status="100"><Reports><Report>']
+    parts += [f'<ColumnHeadings>S{i}</ColumnHeadings>' for i in range(cols)]
+    for d, row in zip(dates, values):
+        parts.append(f'<RowDates>{d:%Y-%m-%dT%H:%M:%S}</RowDates>')
+        parts += [f'<Values>{v:.4f}</Values>' for v in row]
+    parts.append('</Report></Reports></DataRequestResponse>')
+    return etree.fromstring(''.join(parts).encode())[0]
+
+
+@pytest.fixture(scope='module')
+def reports():
+    return make_reports()
+
+
+def bench_legacy_build_dataframe(benchmark, reports):
+    benchmark(legacy_build_dataframe, reports)
+
+
+def bench_build_dataframe(benchmark, reports):
+    df = benchmark(limutils.build_dataframe, reports)
+    pd.testing.assert_frame_equal(df, legacy_build_dataframe(reports), check_freq=False)
+
+
+def bench_build_dataframe_float32(benchmark, reports):
+    benchmark(limutils.build_dataframe, reports, dtype=np.float32)
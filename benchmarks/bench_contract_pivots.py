@@ -0,0 +1,68 @@
+"""
+Benchmark of the contract column conversion and yearly pivot against the previous per-column implementations,
+on a 30 year x 12 month panel.
+
+Run with `pytest benchmarks/bench_contract_pivots.py` (requires pytest-benchmark).
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from commodutil import forwards
+
+from pylim import limutils
+
+
+def legacy_convert_lim_contracts_to_datetime(contracts) -> pd.DataFrame:
+    contracts = contracts.rename(
+        columns={x: pd.to_datetime(forwards.convert_contract_to_date(x)) for x in contracts.columns}
+    )
+    return contracts.reindex(sorted(contracts.columns), axis=1)
+
+
+def legacy_pivots_contract_by_year(df) -> pd.DataFrame:
+    dfs = []
+    for year in set([x.year for x in df.columns]):
+        d = df[[x for x in df.columns if x.year == year]].mean(1)
+        d.name = year
+        dfs.append(d)
+
+    df = pd.concat(dfs, axis=1)
+    return df.reindex(sorted(df.columns), axis=1)
+
+
+def make_contracts(years: int = 30, rows: int = 20 * 260) -> pd.DataFrame:
+    columns = [f'{y}{m}' for y in range(2000, 2000 + years) for m in 'FGHJKMNQUVXZ']
+    values = np.random.default_rng(0).random((rows, len(columns))) * 100
+    return pd.DataFrame(values, index=pd.bdate_range('2000-01-01', periods=rows), columns=columns)
+
+
+@pytest.fixture(scope='module')
+def contracts():
+    return make_contracts()
+
+
+@pytest.fixture(scope='module')
+def dated_contracts(contracts):
+    return limutils.convert_lim_contracts_to_datetime(contracts)
+
+
+def bench_legacy_convert_lim_contracts_to_datetime(benchmark, contracts):
+    benchmark(legacy_convert_lim_contracts_to_datetime, contracts)
+
+
+def bench_convert_lim_contracts_to_datetime(benchmark, contracts):
+    df = benchmark(limutils.convert_lim_contracts_to_datetime, contracts)
+    pd.testing.assert_frame_equal(df, legacy_convert_lim_contracts_to_datetime(contracts))
+
+
+def bench_legacy_pivots_contract_by_year(benchmark, dated_contracts):
+    benchmark(legacy_pivots_contract_by_year, dated_contracts)
+
+
+def bench_pivots_contract_by_year(benchmark, dated_contracts):
+    df = benchmark(limutils.pivots_contract_by_year, dated_contracts)
+    pd.testing.assert_frame_equal(df, legacy_pivots_contract_by_year(dated_contracts))
+
+
+def bench_pivots_contract_by_quarter(benchmark, dated_contracts):
+    benchmark(limutils.pivots_contract_by_quarter, dated_contracts)
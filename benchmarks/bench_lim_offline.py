@@ -0,0 +1,100 @@
+"""
+End to end benchmarks of the pylim entry points against the local LIM stand-in (test/fakelim.py).
+
+Run with `pytest benchmarks/bench_lim_offline.py` (requires pytest-benchmark). Relations and contract lists
+are served from pylim's caches after the first round, except where a benchmark disables them.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from pylim import core
+from pylim import lim
+from pylim import limuploader
+from test.fakelim import FakeLim
+
+symbols = [f'S{i}' for i in range(20)]
+tree = {'Symbols': [(x, 'NORMAL') for x in symbols] + [('FB', 'FUTURES'), ('FP', 'FUTURES')]}
+
+
+@pytest.fixture(scope='module')
+def server():
+    with FakeLim(rows=20 * 260, tree=tree, contract_years=range(2000, 2025)) as server:
+        core.configure_shared_session(server=server.url, username='user', password='secret', pool_maxsize=32)
+        lim.invalidate_relations()
+        yield server
+    core.configure_shared_session()
+    lim.invalidate_relations()
+
+
+@pytest.fixture
+def latency(server):
+    server.latency = 0.02
+    yield
+    server.latency = 0.0
+
+
+def bench_series(benchmark, server):
+    df = benchmark(lim.series, tuple(symbols[:5]))
+    assert df.shape == (server.rows, 5)
+
+
+def bench_series_sequential(benchmark, server, latency):
+    benchmark(lambda: [lim.series(x) for x in symbols])
+
+
+def bench_series_batch(benchmark, server, latency):
+
+    def run():
+        with lim.batch():
+            futures = [lim.series(x) for x in symbols]
+        return [x.result() for x in futures]
+
+    res = benchmark(run)
+    assert all(len(x.columns) == 1 for x in res)
+
+
+def bench_series_many(benchmark, server, latency):
+    res = benchmark(lim.series_many, symbols, max_workers=10)
+    assert all(isinstance(x, pd.DataFrame) for x in res)
+
+
+def bench_relations(benchmark, server):
+    df = benchmark(lim.relations, 'FB', 'FP', *symbols, show_children=True, use_cache=False)
+    assert len(df.columns) == len(symbols) + 2
+
+
+def bench_relation_info(benchmark, server):
+    infos = benchmark(lim.relation_info, 'FB', 'FP', *symbols, show_children=True, use_cache=False)
+    assert len(infos) == len(symbols) + 2
+
+
+def bench_relations_frame(benchmark, server):
+    params = {'showChildren': 'true', 'dateRange': 'true'}
+    content = server.relations_xml(['FB', 'FP', *symbols], params)
+    benchmark(lim._relations_frame, content, show_children=True, date_range=True)
+
+
+def bench_curve_formula(benchmark, server):
+    curve_dates = tuple(pd.bdate_range('2020-01-01', periods=40).date)
+    df = benchmark(lim.curve_formula, 'Show 1: FB - S1', curve_dates=curve_dates)
+    assert len(df.columns) == len(curve_dates)
+
+
+def bench_contracts(benchmark, server):
+    df = benchmark(lim.contracts, 'Show 1: FB - FP', start_year=2000, end_year=2024)
+    assert len(df.columns) == 25 * 12
+
+
+def bench_contracts_chunked(benchmark, server, latency):
+    benchmark(lim.contracts, 'Show 1: FB - FP', start_year=2000, end_year=2024, chunk_size=50, max_workers=6)
+
+
+def bench_upload_series(benchmark, server):
+    df = pd.DataFrame(
+        np.random.default_rng(0).random((260, 50)), index=pd.bdate_range('2020-01-01', periods=260),
+        columns=[f'TopRelation:Test:S{i}' for i in range(50)],
+    )
+    res = benchmark(limuploader.upload_series, df, {'description': 'bench'}, max_chunk_cells=2000)
+    assert all(x.ok for x in res)
@@ -0,0 +1,74 @@
+"""
+Benchmark of the upload XML builder against the previous per-cell element tree implementation.
+
+Run with `pytest benchmarks/bench_upload_xml.py` (requires pytest-benchmark).
+"""
+from datetime import datetime
+
+import lxml.builder
+import numpy as np
+import pandas as pd
+import pytest
+from lxml import etree
+
+from pylim import limuploader
+
+
+def legacy_build_upload_xml(df, dfmeta) -> bytes:
+    E = lxml.builder.ElementMaker()
+    entries = []
+    count = 1
+    for irow, row in df.iterrows():
+        for col, val in row.items():
+            if pd.isna(val):
+                continue
+            tokens = col.split(';')
+            treepath = tokens[0]
+            column = limuploader.default_column if len(tokens) == 1 else tokens[1]
+            desc = dfmeta.get('description', '')
+            if isinstance(irow, pd.Timestamp):
+                irow = irow.date()
+            erow = E.Row(
+                E.Cols(
+                    E.Col(treepath, num="1"),
+                    E.Col(column, num="2"),
+                    E.Col(str((irow - datetime(1899, 12, 30).date()).days), num="3"),
+                    E.Col(str(val), num="4"),
+                    E.Col(desc, num="5"),
+                ),
+                num=str(count)
+            )
+            count = count + 1
+            entries.append(erow)
+
+    root = E.ExcelData()
+    rows = E.Rows()
+    for x in entries:
+        rows.append(x)
+    root.append(rows)
+    return etree.tostring(root, pretty_print=True)
+
+
+def make_frame(rows: int = 3 * 260, cols: int = 100) -> pd.DataFrame:
+    values = np.random.default_rng(0).random((rows, cols)) * 100
+    values[values < 5] = np.nan
+    columns = [f'TopRelation:Test:S{i};TopColumn:Price:Close' if i % 2 else f'TopRelation:Test:S{i}' for i in range(cols)]
+    return pd.DataFrame(values, index=pd.bdate_range('2020-01-01', periods=rows), columns=columns)
+
+
+def canonical(xml: bytes) -> bytes:
+    return etree.tostring(etree.fromstring(xml, etree.XMLParser(remove_blank_text=True)))
+
+
+@pytest.fixture(scope='module')
+def frame():
+    return make_frame()
+
+
+def bench_legacy_build_upload_xml(benchmark, frame):
+    benchmark(legacy_build_upload_xml, frame, {'description': 'desc'})
+
+
+def bench_build_upload_xml(benchmark, frame):
+    xml = benchmark(limuploader.build_upload_xml, frame, {'description': 'desc'})
+    assert canonical(xml) == canonical(legacy_build_upload_xml(frame, {'description': 'desc'}))
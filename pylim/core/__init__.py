@@ -5,13 +5,29 @@ This module handles:
 - Connecting and authentication to the LIM server,
 - XML request/response schema specific to each LIM endpoint,
 - Status codes returned by the API,
-- Polling for results in case of long running jobs,
-- Retry and exception handling logic.
+- Polling for results in case of long running jobs, with backoff and a deadline (see `PollingStrategy`),
+- Submitting jobs and collecting their results later (see `submit` and `attach`),
+- Retry and exception handling logic,
+- Reusing pooled connections across calls, either process-wide or through a `Client`,
+- Async querying through an `AsyncClient` (requires the optional aiohttp dependency),
+- Running many queries concurrently on a bounded thread pool,
+- Sharing one request between concurrent identical queries (see `SingleFlight`),
+- Collecting small requests and running compatible ones merged (see `RequestBatcher`),
+- Caching query results on disk (opt-in, see `enable_cache`),
+- Timing records of every call delivered to pluggable hooks (see `instrumentation`).
 
 To use this module, the clients have to make sure that following environment variables are set:
 - LIMSERVER - URL to the MorningStar API, defaults to https://rwe.morningstarcommodity.com,
 - LIMUSERNAME - login to the MorningStar account,
 - LIMPASSWORD - password for the MorningStar account.
 """
-from .data import query
-from .session import get_lim_session
+from . import instrumentation
+from .aio import AsyncClient, aquery
+from .batch import query_many, run_many
+from .batching import RequestBatcher
+from .cache import ResultCache, TTLCache, disable_cache, enable_cache, get_cache
+from .client import Client
+from .data import DataRequestJob, attach, query, submit
+from .polling import JobTimeoutError, PollingStrategy
+from .session import configure_shared_session, get_lim_session, get_shared_session, reset_shared_session
+from .singleflight import AsyncSingleFlight, SingleFlight
@@ -0,0 +1,229 @@
+"""
+Asyncio counterpart of `pylim.core.data`, built on aiohttp.
+
+One `AsyncClient` shares a connection pool between all queries issued through it and caps the
+number of concurrent HTTP requests, so many LIM jobs can be submitted and polled from a single
+event loop. Requires the optional `aiohttp` dependency (`pip install pylim[async]`).
+"""
+import asyncio
+import logging
+import time
+import typing as t
+import weakref
+from os import getenv
+from urllib.parse import urljoin
+
+import numpy as np
+import pandas as pd
+import requests
+
+from pylim import limqueryutils
+from pylim.core import data
+from pylim.core import instrumentation
+from pylim.core.polling import JobTimeoutError, PollingStrategy, parse_retry_after
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+logger = logging.getLogger(__name__)
+
+default_max_concurrency = 10
+retry_statuses = {429, 500, 502, 503, 504}
+retry_total = 3
+retry_backoff_factor = 2
+
+
+class AsyncClient:
+    """
+    Async HTTP client for the LIM API with a shared connection pool and a concurrency limiter.
+
+    Example:
+    .. code-block:: python
+        >>> async with AsyncClient(max_concurrency=20) as client:
+        ...     dfs = await asyncio.gather(*(client.query(q) for q in queries))
+    """
+
+    def __init__(
+            self,
+            server: t.Optional[str] = None,
+            username: t.Optional[str] = None,
+            password: t.Optional[str] = None,
+            max_concurrency: int = default_max_concurrency,
+    ):
+        if aiohttp is None:
+            raise ImportError('AsyncClient requires aiohttp, install it with `pip install pylim[async]`')
+        self.base_url = server or getenv("LIMSERVER", "https://rwe.morningstarcommodity.com")
+        self.auth = aiohttp.BasicAuth(username or getenv("LIMUSERNAME", ""), password or getenv("LIMPASSWORD", ""))
+        self.max_concurrency = max_concurrency
+        self._session: t.Optional['aiohttp.ClientSession'] = None
+        self._semaphore: t.Optional[asyncio.Semaphore] = None
+
+    def _get_session(self) -> 'aiohttp.ClientSession':
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                auth=self.auth,
+                headers={"Content-Type": "application/xml"},
+                connector=aiohttp.TCPConnector(limit=self.max_concurrency),
+                trust_env=True,
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._session
+
+    async def request(self, method: str, url: str, **kwargs) -> t.Tuple[bytes, str]:
+        """
+        Send a request and return the response body and the final URL.
+
+        Idempotent requests are retried on throttling and server errors, like the sync session.
+        """
+        content, url, _ = await self._send(method, url, **kwargs)
+        return content, url
+
+    async def _send(self, method: str, url: str, **kwargs) -> t.Tuple[bytes, str, t.Mapping[str, str]]:
+        session = self._get_session()
+        url = urljoin(self.base_url, url)
+        attempt = 0
+        while True:
+            async with self._semaphore:
+                async with session.request(method, url, **kwargs) as response:
+                    content = await response.read()
+                    status = response.status
+                    headers = response.headers
+            if status in retry_statuses and method in {"HEAD", "GET", "OPTIONS"} and attempt < retry_total:
+                attempt += 1
+                await asyncio.sleep(retry_backoff_factor * 2 ** (attempt - 1))
+                continue
+            if status >= 400:
+                text = content.decode(errors='replace')
+                logger.error(f'Response error: Code: {status} Msg: {text}')
+                raise requests.HTTPError(
+                    f'{status} Error for url: {url}', response=_response(status, content, url, headers),
+                )
+            return content, url, headers
+
+    async def query(
+            self,
+            query_text: str,
+            dtype: t.Union[str, np.dtype] = np.float64,
+            polling: t.Optional[PollingStrategy] = None,
+            timeout: t.Optional[float] = None,
+    ) -> pd.DataFrame:
+        """
+        Execute a LIM query, polling for the result without blocking the event loop.
+
+        :param polling: Polling strategy, defaults to `pylim.core.data.polling`.
+        :param timeout: Seconds to wait for the job, defaults to the deadline of the polling strategy.
+        :raises JobTimeoutError: When the job isn't done in time, collect it later with its `job_id`.
+        """
+        query_text = limqueryutils.prepare_query(query_text)
+        record = instrumentation.start('query', query_text)
+        try:
+            df = await self._query(query_text, dtype, polling or data.polling, timeout, record)
+        except BaseException as e:
+            if record is not None:
+                instrumentation.finish(record, e)
+            raise
+        if record is not None:
+            instrumentation.finish(record)
+        return df
+
+    async def _query(
+            self,
+            query_text: str,
+            dtype: t.Union[str, np.dtype],
+            strategy: PollingStrategy,
+            timeout: t.Optional[float],
+            record: t.Optional[instrumentation.CallRecord],
+    ) -> pd.DataFrame:
+        start = time.perf_counter()
+        content, url, headers = await self._send('POST', data.endpoint_url, data=data.build_request_body(query_text))
+        if record is not None:
+            record.submit = time.perf_counter() - start
+        expires_at = strategy.expires_at(timeout)
+        attempt = 0
+        while True:
+            try:
+                df, job_id = data.read_response(content, query_text, url=url, dtype=dtype, record=record)
+            except requests.HTTPError as e:
+                e.response = _response(200, content, url, headers)
+                raise
+            if df is not None:
+                return df
+            if record is not None:
+                record.job_id = job_id
+            remaining = expires_at - time.monotonic()
+            if remaining <= 0:
+                raise JobTimeoutError(f'Job {job_id} not complete, run out of time', job_id=job_id)
+            start = time.perf_counter()
+            await asyncio.sleep(min(strategy.delay(attempt, parse_retry_after(headers.get('Retry-After'))), remaining))
+            if record is not None:
+                record.poll_wait += time.perf_counter() - start
+            logging.info(f'Job {job_id} not complete, polling...')
+            content, url, headers = await self._send('GET', f'{data.endpoint_url}/{job_id}')
+            if record is not None:
+                record.polls += 1
+                record.poll += time.perf_counter() - start
+            attempt += 1
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def __aenter__(self) -> 'AsyncClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+
+def _response(status: int, content: bytes, url: str, headers: t.Mapping[str, str]) -> requests.Response:
+    """
+    requests.Response equivalent of an aiohttp response, attached to errors like on the sync path.
+    """
+    response = requests.Response()
+    response.status_code = status
+    response._content = content
+    response.url = url
+    response.headers = requests.structures.CaseInsensitiveDict(headers)
+    return response
+
+
+_default_clients: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncClient]' = weakref.WeakKeyDictionary()
+
+
+def get_async_client() -> AsyncClient:
+    """
+    Default client of the running event loop, shared by all async calls that aren't given a client.
+
+    aiohttp sessions are bound to the loop that created them, so each loop gets its own client.
+    Close it with `close_async_client()` before the loop ends.
+    """
+    loop = asyncio.get_running_loop()
+    client = _default_clients.get(loop)
+    if client is None:
+        client = _default_clients[loop] = AsyncClient()
+    return client
+
+
+async def close_async_client() -> None:
+    client = _default_clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.close()
+
+
+async def aquery(
+        query_text: str,
+        client: t.Optional[AsyncClient] = None,
+        dtype: t.Union[str, np.dtype] = np.float64,
+) -> pd.DataFrame:
+    """
+    Async version of `pylim.core.query`.
+
+    :param query_text: A MorningStar LIM query text.
+    :param client: Client to send the request with, defaults to the running loop's shared client.
+    :param dtype: Float type of the result values.
+    """
+    client = client or get_async_client()
+    return await client.query(query_text, dtype=dtype)
@@ -0,0 +1,107 @@
+"""
+Running many LIM calls concurrently on a bounded thread pool.
+
+All workers send their requests through the shared pooled session, so keep `max_workers` at or
+below the session pool size (see `pylim.core.configure_shared_session`).
+"""
+import threading
+import time
+import typing as t
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import requests
+
+from pylim.core import data
+
+default_max_workers = 8
+
+T = t.TypeVar('T')
+R = t.TypeVar('R')
+
+
+class RateLimiter:
+    """
+    Spaces out calls so that no more than `rate` of them start per second, across all threads.
+    """
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self._lock = threading.Lock()
+        self._next_call = time.monotonic()
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            delay = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def run_many(
+        func: t.Callable[[T], R],
+        items: t.Iterable[T],
+        max_workers: int = default_max_workers,
+        rate_limit: t.Optional[float] = None,
+        retries: int = 0,
+        retry_delay: float = 1.0,
+        progress: t.Optional[t.Callable[[int, int], None]] = None,
+) -> t.List[t.Union[R, Exception]]:
+    """
+    Call `func` on every item concurrently.
+
+    :param func: Callable taking a single item.
+    :param items: Arguments to call `func` with.
+    :param max_workers: Maximum number of calls running at the same time.
+    :param rate_limit: Maximum number of calls started per second, unlimited when None.
+    :param retries: Number of times a call that raised is retried, on its own.
+    :param retry_delay: Seconds to wait before the first retry, doubled on each further retry.
+    :param progress: Called with the number of finished items and the total after each item.
+    :return: Results in the order of `items`. A call that raised has its exception in place of the result,
+             so one failure doesn't abort the whole batch.
+    """
+    items = list(items)
+    limiter = RateLimiter(rate_limit) if rate_limit else None
+    lock = threading.Lock()
+    done = 0
+
+    def call(item: T) -> t.Union[R, Exception]:
+        nonlocal done
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(retry_delay * 2 ** (attempt - 1))
+            if limiter is not None:
+                limiter.wait()
+            try:
+                result = func(item)
+                break
+            except Exception as e:
+                result = e
+        if progress is not None:
+            with lock:
+                done += 1
+                progress(done, len(items))
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(call, items))
+
+
+def query_many(
+        queries: t.Iterable[str],
+        max_workers: int = default_max_workers,
+        rate_limit: t.Optional[float] = None,
+        session: t.Optional[requests.Session] = None,
+) -> t.List[t.Union[pd.DataFrame, Exception]]:
+    """
+    Execute many LIM queries in parallel, see `run_many` for the result layout.
+
+    :param queries: MorningStar LIM query texts.
+    :param max_workers: Maximum number of queries in flight at the same time.
+    :param rate_limit: Maximum number of queries submitted per second, unlimited when None.
+    :param session: HTTP session to send the requests with, defaults to the shared pooled session.
+    """
+    return run_many(
+        lambda q: data.query(q, session=session), queries, max_workers=max_workers, rate_limit=rate_limit,
+    )
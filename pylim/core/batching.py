@@ -0,0 +1,96 @@
+"""
+Collecting small requests and running compatible ones as one merged request.
+
+Requests are grouped by a key, all requests of a group being mergeable. A group runs when its collection
+window expires, when it reaches `max_size`, or on `flush`. Each request gets a Future of its own result.
+"""
+import threading
+import typing as t
+from concurrent.futures import Future
+
+K = t.TypeVar('K')
+T = t.TypeVar('T')
+
+
+class RequestBatcher:
+    """
+    :param execute: Called with a group key and its requests, returns the results in the same order.
+                    An exception in place of a result fails that request only, an exception raised fails
+                    the whole group.
+    :param window: Seconds a group collects requests after its first one before running. Groups only
+                   run on `flush` (or on leaving the `with` block) when None.
+    :param max_size: Number of requests at which a group runs straight away, unbounded when None.
+
+    Example:
+    .. code-block:: python
+        >>> with RequestBatcher(execute) as batcher:
+        ...     futures = [batcher.submit(key, item) for item in items]
+        >>> results = [f.result() for f in futures]
+    """
+
+    def __init__(
+            self,
+            execute: t.Callable[[K, t.List[T]], t.List[t.Any]],
+            window: t.Optional[float] = None,
+            max_size: t.Optional[int] = None,
+    ):
+        self.execute = execute
+        self.window = window
+        self.max_size = max_size
+        self._groups: t.Dict[K, t.List[t.Tuple[T, Future]]] = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key: K, item: T) -> Future:
+        future = Future()
+        with self._lock:
+            group = self._groups.setdefault(key, [])
+            group.append((item, future))
+            first, full = len(group) == 1, self.max_size is not None and len(group) >= self.max_size
+            if full:
+                del self._groups[key]
+        if full:
+            self._run(key, group)
+        elif first and self.window is not None:
+            timer = threading.Timer(self.window, self._flush_group, args=(key, group))
+            timer.daemon = True
+            timer.start()
+        return future
+
+    def flush(self) -> None:
+        """
+        Run all pending groups now, in the calling thread.
+        """
+        with self._lock:
+            groups, self._groups = self._groups, {}
+        for key, group in groups.items():
+            self._run(key, group)
+
+    def _flush_group(self, key: K, group: t.List[t.Tuple[T, Future]]) -> None:
+        with self._lock:
+            # The group may have been run already because it filled up or was flushed.
+            if self._groups.get(key) is not group:
+                return
+            del self._groups[key]
+        self._run(key, group)
+
+    def _run(self, key: K, group: t.List[t.Tuple[T, Future]]) -> None:
+        group = [(item, future) for item, future in group if future.set_running_or_notify_cancel()]
+        if not group:
+            return
+        try:
+            results = self.execute(key, [item for item, _ in group])
+        except BaseException as e:
+            for _, future in group:
+                future.set_exception(e)
+            return
+        for (_, future), result in zip(group, results):
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def __enter__(self) -> 'RequestBatcher':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
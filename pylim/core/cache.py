@@ -0,0 +1,301 @@
+"""
+Opt-in on-disk cache of query results.
+
+Results are stored as one file per query, keyed by a hash of the normalized query text. Files are
+written to a temporary name and atomically renamed, and readers tolerate entries disappearing, so
+one cache directory can be shared by several processes.
+
+Example:
+.. code-block:: python
+    >>> from pylim import core
+    >>> core.enable_cache('/data/limcache', ttl=3600, max_size=2 * 1024 ** 3)
+    >>> df = lim.series('FB')  # served from disk on the next call within the hour
+"""
+import hashlib
+import importlib.util
+import os
+import tempfile
+import threading
+import time
+import typing as t
+from collections import OrderedDict
+from datetime import timedelta
+from pathlib import Path
+
+import pandas as pd
+
+from pylim import limqueryutils
+
+default_directory = os.path.join(os.path.expanduser('~'), '.cache', 'pylim')
+# Results of most queries grow as LIM receives new data (no when clause, 'date is within', LAST, ...),
+# so by default entries are only served for an hour.
+default_ttl = 3600.0
+formats = {'parquet': '.parquet', 'feather': '.feather', 'pickle': '.pkl'}
+# Modules any of which can read and write each format.
+format_engines = {'parquet': ('pyarrow', 'fastparquet'), 'feather': ('pyarrow',), 'pickle': ()}
+
+
+def normalize_query(query_text: str) -> str:
+    """
+    Query text as sent to LIM, with whitespace collapsed so formatting differences share an entry.
+    """
+    return ' '.join(limqueryutils.prepare_query(query_text).split())
+
+
+class ResultCache:
+    """
+    Directory of cached DataFrames with TTL expiry and size-based LRU eviction.
+
+    :param directory: Where the entries are stored, created if missing.
+    :param ttl: Maximum age of an entry, in seconds or as a timedelta. Entries never expire when None, which
+                only suits queries over a fixed past date range.
+    :param max_size: Maximum total size of the entries in bytes. Least recently used entries are
+                     evicted above it. Unbounded when None.
+    :param fmt: File format of the entries, one of 'parquet', 'feather' (both need pyarrow) or 'pickle'.
+                'pickle' also stores Series, frames holding nested objects and other picklable objects.
+    :raises ImportError: When the library the format needs is not installed.
+    """
+
+    def __init__(
+            self,
+            directory: t.Union[str, os.PathLike] = default_directory,
+            ttl: t.Optional[t.Union[float, timedelta]] = default_ttl,
+            max_size: t.Optional[int] = None,
+            fmt: str = 'parquet',
+    ):
+        if fmt not in formats:
+            raise ValueError(f'Unknown cache format {fmt}, expected one of {", ".join(formats)}')
+        engines = format_engines[fmt]
+        if engines and not any(importlib.util.find_spec(x) for x in engines):
+            raise ImportError(
+                f'The {fmt} cache format requires {" or ".join(engines)}, install it with '
+                f'`pip install pylim[cache]` or use fmt="pickle"'
+            )
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl.total_seconds() if isinstance(ttl, timedelta) else ttl
+        self.max_size = max_size
+        self.fmt = fmt
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def key(self, query_text: str) -> str:
+        return hashlib.sha256(normalize_query(query_text).encode()).hexdigest()
+
+    def path(self, key: str) -> Path:
+        return self.directory / f'{key}{formats[self.fmt]}'
+
+    def get(self, key: str, ttl: t.Optional[float] = None) -> t.Optional[pd.DataFrame]:
+        """
+        Return the cached frame for `key`, or None when it is missing or older than the TTL.
+
+        :param ttl: Overrides the cache TTL for this lookup.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        path = self.path(key)
+        try:
+            stat = path.stat()
+            if ttl is not None and time.time() - stat.st_mtime > ttl:
+                df = None
+            else:
+                df = self._read(path)
+                # Record the access time for LRU eviction, keep the write time for the TTL.
+                os.utime(path, (time.time(), stat.st_mtime))
+        except (FileNotFoundError, EOFError):
+            df = None
+        with self._lock:
+            if df is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return df
+
+    def put(self, key: str, df: pd.DataFrame) -> None:
+        path = self.path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix='.tmp-', suffix=path.suffix)
+        os.close(fd)
+        try:
+            self._write(df, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        if self.max_size is not None:
+            self.evict(self.max_size)
+
+    def load(self, name: str) -> t.Optional[pd.DataFrame]:
+        """
+        Return a frame saved with `store`, these don't expire and are only removed by LRU eviction.
+        """
+        return self.get(self.key(f'store:{name}'), ttl=float('inf'))
+
+    def store(self, name: str, df: pd.DataFrame) -> None:
+        self.put(self.key(f'store:{name}'), df)
+
+    def invalidate(self, key: str) -> None:
+        try:
+            self.path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    def clear(self) -> None:
+        for path in self._entries():
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def evict(self, max_size: int) -> None:
+        """
+        Delete least recently used entries until the cache is no bigger than `max_size` bytes.
+        """
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_atime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda x: x[0]):
+            if total <= max_size:
+                break
+            try:
+                path.unlink()
+                with self._lock:
+                    self.evictions += 1
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def size(self) -> int:
+        total = 0
+        for path in self._entries():
+            try:
+                total += path.stat().st_size
+            except FileNotFoundError:
+                pass
+        return total
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'size': self.size()}
+
+    def _entries(self) -> t.List[Path]:
+        return [x for x in self.directory.glob(f'*{formats[self.fmt]}') if not x.name.startswith('.tmp-')]
+
+    def _read(self, path: Path) -> pd.DataFrame:
+        if self.fmt == 'parquet':
+            return pd.read_parquet(path)
+        if self.fmt == 'feather':
+            df = pd.read_feather(path)
+            return df.set_index(df.columns[0]).rename_axis(None)
+        return pd.read_pickle(path)
+
+    def _write(self, df: pd.DataFrame, path: str) -> None:
+        if self.fmt == 'parquet':
+            df.to_parquet(path)
+        elif self.fmt == 'feather':
+            df.rename_axis('__index__').reset_index().to_feather(path)
+        else:
+            # Entries may be any picklable object, eg the RelationInfo records of the relations cache.
+            pd.to_pickle(df, path)
+
+
+_missing = object()
+
+
+class TTLCache:
+    """
+    Bounded, thread-safe in-memory mapping whose entries expire after a TTL.
+
+    The least recently used entries are dropped once `maxsize` is reached.
+
+    :param maxsize: Maximum number of entries.
+    :param ttl: Default lifetime of an entry in seconds, entries never expire when None.
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: t.Optional[float] = 600):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data: 'OrderedDict[t.Hashable, t.Tuple[float, t.Any]]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: t.Hashable, default: t.Any = None) -> t.Any:
+        with self._lock:
+            entry = self._data.get(key, _missing)
+            if entry is not _missing and entry[0] < time.monotonic():
+                del self._data[key]
+                entry = _missing
+            if entry is _missing:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key: t.Hashable, value: t.Any, ttl: t.Optional[float] = None) -> None:
+        """
+        :param ttl: Lifetime of this entry in seconds, defaults to the cache TTL.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = float('inf') if ttl is None else time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, predicate: t.Optional[t.Callable[[t.Hashable], bool]] = None) -> None:
+        """
+        Drop the entries whose key matches `predicate`, or all entries when it is None.
+        """
+        with self._lock:
+            if predicate is None:
+                self._data.clear()
+            else:
+                for key in [x for x in self._data if predicate(x)]:
+                    del self._data[key]
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._data)}
+
+
+_result_cache: t.Optional[ResultCache] = None
+
+
+def enable_cache(
+        directory: t.Optional[t.Union[str, os.PathLike]] = None,
+        ttl: t.Optional[t.Union[float, timedelta]] = default_ttl,
+        max_size: t.Optional[int] = None,
+        fmt: str = 'parquet',
+) -> ResultCache:
+    """
+    Serve `query` (and so `lim.series`, `lim.curve`, ...) results from an on-disk cache, see `ResultCache`.
+
+    :param directory: Cache directory, defaults to the LIMCACHEDIR environment variable or ~/.cache/pylim.
+    :param ttl: Maximum age of a result, one hour by default. Most queries, eg those of `lim.series` without
+                a fixed end date, return more data as time passes, so None (never expire) serves stale results.
+    """
+    global _result_cache
+    _result_cache = ResultCache(
+        directory or os.getenv('LIMCACHEDIR', default_directory), ttl=ttl, max_size=max_size, fmt=fmt,
+    )
+    return _result_cache
+
+
+def disable_cache() -> None:
+    global _result_cache
+    _result_cache = None
+
+
+def get_cache() -> t.Optional[ResultCache]:
+    return _result_cache
@@ -0,0 +1,63 @@
+"""
+Client object owning a pooled HTTP session to the LIM API.
+"""
+import os
+import threading
+import typing as t
+
+import pandas as pd
+import requests
+
+from pylim.core import data
+from pylim.core.session import get_lim_session
+
+
+class Client:
+    """
+    Holds LIM connection settings and a pooled session reused by every call made through it.
+
+    Example:
+    .. code-block:: python
+        >>> with Client(pool_maxsize=32) as client:
+        ...     df = client.query('Show FB: FB when date is within 5 days')
+        ...     meta = lim.relations('FB', session=client.session)
+    """
+
+    def __init__(
+            self,
+            server: t.Optional[str] = None,
+            username: t.Optional[str] = None,
+            password: t.Optional[str] = None,
+            pool_maxsize: t.Optional[int] = None,
+            keep_alive: bool = True,
+    ):
+        self._session_options = dict(
+            server=server, username=username, password=password, pool_maxsize=pool_maxsize, keep_alive=keep_alive,
+        )
+        self._session: t.Optional[requests.Session] = None
+        self._pid: t.Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self) -> requests.Session:
+        """Pooled session of this client, built on first use and rebuilt in a forked child process."""
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                self._session = get_lim_session(**self._session_options)
+                self._pid = os.getpid()
+            return self._session
+
+    def query(self, query_text: str) -> pd.DataFrame:
+        return data.query(query_text, session=self.session)
+
+    def close(self) -> None:
+        with self._lock:
+            session, self._session, self._pid = self._session, None, None
+        if session is not None:
+            session.close()
+
+    def __enter__(self) -> 'Client':
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
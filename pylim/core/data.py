@@ -3,55 +3,311 @@ Logic to interact with /rs/api/datarequests resource.
 """
 import logging
 import time
+import typing as t
 from pylim import limqueryutils
 
+import numpy as np
 import pandas as pd
 import requests
 from lxml import etree
 
-from pylim.core.session import get_lim_session
-from pylim.limutils import build_dataframe
+from pylim.core import cache
+from pylim.core import instrumentation
+from pylim.core.polling import JobTimeoutError, PollingStrategy, parse_retry_after
+from pylim.core.singleflight import SingleFlight
+from pylim.core.session import get_shared_session
+from pylim.limutils import build_dataframe, iterparse_response
 
-calltries = 50
-sleep_seconds = 0.5
+# Default polling of running jobs, replace it to change the backoff or deadline.
+polling = PollingStrategy()
+# Queries in flight, see `query`.
+flights = SingleFlight()
 endpoint_url = '/rs/api/datarequests'
 
 
-def query(query_text: str) -> pd.DataFrame:
+def build_request_body(query_text: str) -> str:
+    return f'<DataRequest><Query><Text>{query_text}</Text></Query></DataRequest>'
+
+
+def read_response(
+        content: bytes,
+        query_text: str,
+        url: str = endpoint_url,
+        dtype: t.Union[str, np.dtype] = np.float64,
+        record: t.Optional[instrumentation.CallRecord] = None,
+) -> t.Tuple[t.Optional[pd.DataFrame], t.Optional[int]]:
+    """
+    Interpret a datarequests response body.
+
+    :param record: Instrumentation record the download size and parse and build timings are added to.
+    :return: Tuple of the result DataFrame (when the job completed) and the job id (when it is still running).
+    :raises requests.HTTPError: When LIM reports an error for the query.
+    """
+    if record is None:
+        root = etree.fromstring(content)
+        return _read_status(root.attrib, lambda: build_dataframe(root[0], dtype=dtype), query_text, url)
+
+    start = time.perf_counter()
+    root = etree.fromstring(content)
+    record.parse += time.perf_counter() - start
+    record.download_bytes += len(content)
+
+    def build() -> pd.DataFrame:
+        start = time.perf_counter()
+        df = build_dataframe(root[0], dtype=dtype)
+        record.build += time.perf_counter() - start
+        return df
+
+    return _read_status(root.attrib, build, query_text, url)
+
+
+def read_stream(
+        response: requests.Response,
+        query_text: str,
+        dtype: t.Union[str, np.dtype] = np.float64,
+        record: t.Optional[instrumentation.CallRecord] = None,
+) -> t.Tuple[t.Optional[pd.DataFrame], t.Optional[int]]:
+    """
+    Same as `read_response` for a response requested with `stream=True`, parsed incrementally.
+
+    Download and parsing overlap, so the whole read is recorded as parse time.
+    """
+    response.raw.decode_content = True
+    start = time.perf_counter() if record is not None else 0.0
+    attrib, df = iterparse_response(response.raw, dtype=dtype)
+    if record is not None:
+        record.parse += time.perf_counter() - start
+        record.download_bytes += response.raw.tell()
+    return _read_status(attrib, lambda: df, query_text, response.url)
+
+
+def _read_status(
+        attrib: t.Mapping[str, str], build: t.Callable[[], pd.DataFrame], query_text: str, url: str,
+) -> t.Tuple[t.Optional[pd.DataFrame], t.Optional[int]]:
+    status_code = int(attrib["status"])
+    if status_code == 100:
+        df = build()
+        df.attrs['query'] = query_text
+        return df, None
+    elif status_code == 130:
+        logging.info('No data')
+        df = pd.DataFrame()
+        df.attrs['query'] = query_text
+        return df, None
+    elif status_code == 200:
+        return None, int(attrib['id'])
+    status_message = attrib["statusMsg"]
+    raise requests.HTTPError(f"{status_code} LIM Client Error: {status_message} for url: {url}")
+
+
+def query(
+        query_text: str,
+        session: t.Optional[requests.Session] = None,
+        dtype: t.Union[str, np.dtype] = np.float64,
+        stream: bool = False,
+        use_cache: bool = True,
+) -> pd.DataFrame:
+    """
+    Execute a LIM query and return the result as a DataFrame.
+
+    :param query_text: A MorningStar LIM query text.
+    :param session: HTTP session to send the request with, defaults to the shared pooled session.
+    :param dtype: Float type of the result values, e.g. float32 to halve memory use.
+    :param stream: Parse the response incrementally while it downloads, which keeps peak memory close
+                   to the size of the result for very large histories.
+    :param use_cache: Whether to use the result cache, when one is enabled with `pylim.core.enable_cache`.
+    """
     query_text = limqueryutils.prepare_query(query_text)
-    with get_lim_session() as session:
-        response = session.post(
-            endpoint_url,
-            data=f'<DataRequest><Query><Text>{query_text}</Text></Query></DataRequest>',
-        )
-        attempt = 1
-        while True:
-            root = etree.fromstring(response.content)
-            status_code = int(root.attrib["status"])
-            if status_code == 100:
-                df = build_dataframe(root[0])
-                df.attrs['query'] = query_text
-                return df
-            elif status_code == 130:
-                logging.info('No data')
-                df = pd.DataFrame()
-                df.attrs['query'] = query_text
-                return df
-            elif status_code == 200:
-                job_id = int(root.attrib['id'])
-                logging.info(f'Job {job_id} not complete, starting to poll...')
-                # Overwrite the response object for the next loop iteration.
-                response = session.get(f'{endpoint_url}/{job_id}')
-            else:
-                status_message = root.attrib["statusMsg"]
-                raise requests.HTTPError(
-                    f"{status_code} LIM Client Error: {status_message} for url: {response.url}", response=response
-                )
-            if attempt >= calltries:
-                break
-            if attempt > 1:
-                time.sleep(sleep_seconds)
+    result_cache = cache.get_cache() if use_cache else None
+    if result_cache is not None:
+        key = result_cache.key(query_text)
+        df = result_cache.get(key)
+        if df is not None:
+            df = df.astype(dtype, copy=False)
+            df.attrs['query'] = query_text
+            record = instrumentation.start('query', query_text)
+            if record is not None:
+                record.cache_hit = True
+                instrumentation.finish(record)
+            return df
+
+    def execute() -> pd.DataFrame:
+        df = _execute(query_text, session=session, dtype=dtype, stream=stream)
+        if result_cache is not None and len(df):
+            try:
+                result_cache.put(key, df)
+            except Exception as e:
+                # The query succeeded, a cache that can't be written only costs the next call a download.
+                logging.warning(f'Could not write query result to the cache: {e}')
+        return df
+
+    # Identical queries running at the same time share one LIM job, only the caller running it writes the cache.
+    return flights.do((query_text, np.dtype(dtype).str, session), execute, copy=pd.DataFrame.copy)
+
+
+class DataRequestJob:
+    """
+    Handle of a datarequests job, to collect its result later or from another process.
+
+    Create it with `submit`, or with `attach` from a job id kept from an earlier call.
+
+    Example:
+    .. code-block:: python
+        >>> job = submit('Show FB: FB')
+        >>> job.job_id  # None when the server answered straight away
+        >>> df = job.result(timeout=60)
+    """
+
+    def __init__(
+            self,
+            job_id: t.Optional[int],
+            query_text: str = '',
+            session: t.Optional[requests.Session] = None,
+            dtype: t.Union[str, np.dtype] = np.float64,
+            stream: bool = False,
+            polling: t.Optional[PollingStrategy] = None,
+    ):
+        self.job_id = job_id
+        self.query_text = query_text
+        self.session = session
+        self.dtype = dtype
+        self.stream = stream
+        self.polling = polling
+        # Instrumentation record of the call, until it is passed to the hooks.
+        self.record: t.Optional[instrumentation.CallRecord] = None
+        self._result: t.Optional[pd.DataFrame] = None
+        self._retry_after: t.Optional[float] = None
+
+    def done(self) -> bool:
+        return self._result is not None
+
+    def status(self) -> str:
+        """
+        Check the job on the server once, 'done' when its result is available and 'running' otherwise.
+
+        :raises requests.HTTPError: When LIM reports an error for the query.
+        """
+        if self._result is None:
+            self._poll()
+        return 'done' if self._result is not None else 'running'
+
+    def result(self, timeout: t.Optional[float] = None) -> pd.DataFrame:
+        """
+        Wait for the job and return its result.
+
+        :param timeout: Seconds to wait, defaults to the deadline of the polling strategy.
+        :raises JobTimeoutError: When the job isn't done in time, it can still be collected later.
+        """
+        strategy = self.polling or polling
+        expires_at = strategy.expires_at(timeout)
+        attempt = 0
+        while self._result is None:
+            record = self.record
+            start = time.perf_counter() if record is not None else 0.0
+            waited = strategy.wait(attempt, expires_at, retry_after=self._retry_after)
+            if record is not None:
+                record.poll_wait += time.perf_counter() - start
+                record.poll += time.perf_counter() - start
+            if not waited:
+                error = JobTimeoutError(f'Job {self.job_id} not complete, run out of time', job_id=self.job_id)
+                self._finish(error)
+                raise error
+            self._poll()
             attempt += 1
-            
-    # Loop completed without returning any result.
-    raise requests.exceptions.RetryError('Run out of tries')
+        return self._result
+
+    def _poll(self) -> None:
+        logging.info(f'Job {self.job_id} not complete, polling...')
+        session = self.session or get_shared_session()
+        record = self.record
+        start = time.perf_counter() if record is not None else 0.0
+        try:
+            response = session.get(f'{endpoint_url}/{self.job_id}', stream=self.stream)
+        except Exception as e:
+            self._finish(e)
+            raise
+        if record is not None:
+            record.polls += 1
+            record.poll += time.perf_counter() - start
+        self._result, _ = self._read(response)
+        if self._result is not None:
+            self._finish()
+
+    def _read(self, response: requests.Response) -> t.Tuple[t.Optional[pd.DataFrame], t.Optional[int]]:
+        self._retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        try:
+            with response:
+                if self.stream:
+                    return read_stream(response, self.query_text, dtype=self.dtype, record=self.record)
+                return read_response(
+                    response.content, self.query_text, url=response.url, dtype=self.dtype, record=self.record,
+                )
+        except requests.HTTPError as e:
+            e.response = response
+            self._finish(e)
+            raise
+
+    def _finish(self, error: t.Optional[BaseException] = None) -> None:
+        if self.record is not None:
+            record, self.record = self.record, None
+            instrumentation.finish(record, error)
+
+
+def submit(
+        query_text: str,
+        session: t.Optional[requests.Session] = None,
+        dtype: t.Union[str, np.dtype] = np.float64,
+        stream: bool = False,
+        polling: t.Optional[PollingStrategy] = None,
+) -> DataRequestJob:
+    """
+    Send a LIM query without waiting for the result, which is collected from the returned job.
+
+    Arguments are the same as `query`, the result cache is not used.
+
+    :param polling: Polling strategy of the job, defaults to the module `polling`.
+    """
+    query_text = limqueryutils.prepare_query(query_text)
+    job = DataRequestJob(None, query_text, session=session, dtype=dtype, stream=stream, polling=polling)
+    record = job.record = instrumentation.start('query', query_text)
+    start = time.perf_counter() if record is not None else 0.0
+    try:
+        response = (session or get_shared_session()).post(
+            endpoint_url, data=build_request_body(query_text), stream=stream,
+        )
+    except Exception as e:
+        job._finish(e)
+        raise
+    if record is not None:
+        record.submit = time.perf_counter() - start
+    job._result, job.job_id = job._read(response)
+    if record is not None:
+        record.job_id = job.job_id
+    if job._result is not None:
+        job._finish()
+    return job
+
+
+def attach(
+        job_id: int,
+        query_text: str = '',
+        session: t.Optional[requests.Session] = None,
+        dtype: t.Union[str, np.dtype] = np.float64,
+        stream: bool = False,
+        polling: t.Optional[PollingStrategy] = None,
+) -> DataRequestJob:
+    """
+    Handle of a job submitted earlier, eg after its `result` timed out, without resubmitting the query.
+
+    :param query_text: Query of the job, only used to tag the result.
+    """
+    return DataRequestJob(job_id, query_text, session=session, dtype=dtype, stream=stream, polling=polling)
+
+
+def _execute(
+        query_text: str,
+        session: t.Optional[requests.Session] = None,
+        dtype: t.Union[str, np.dtype] = np.float64,
+        stream: bool = False,
+) -> pd.DataFrame:
+    return submit(query_text, session=session, dtype=dtype, stream=stream).result()
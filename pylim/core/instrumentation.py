@@ -0,0 +1,168 @@
+"""
+Per-call timing records of LIM requests, delivered to pluggable hooks.
+
+Every datarequests and relations call produces a `CallRecord` with its phase timings (submit, polling,
+parse, frame build), the downloaded bytes, the job id and a hash of the query. Records are only built
+while at least one hook is installed, otherwise instrumentation costs a single check per call.
+
+Example:
+.. code-block:: python
+    >>> from pylim.core import instrumentation
+    >>> instrumentation.add_hook(instrumentation.logging_hook())
+    >>> instrumentation.add_hook(lambda record: print(record.as_dict()))
+    >>> instrumentation.add_hook(instrumentation.span_hook(opentelemetry.trace.get_tracer('pylim')))
+"""
+import contextlib
+import hashlib
+import logging
+import time
+import typing as t
+
+logger = logging.getLogger(__name__)
+
+Hook = t.Callable[['CallRecord'], None]
+
+hooks: t.List[Hook] = []
+
+
+class CallRecord:
+    """
+    Timings of one call, in seconds.
+
+    :ivar kind: 'query', 'relations' or the name given to `measure`.
+    :ivar submit: Time to send the request and receive the first response, including server queueing.
+    :ivar polls: Number of polls made for a running job.
+    :ivar poll_wait: Time slept between polls.
+    :ivar poll: Time spent polling, sleeps included.
+    :ivar download_bytes: Size of the response bodies.
+    :ivar parse: Time to parse the XML.
+    :ivar build: Time to build the DataFrame from the parsed XML.
+    :ivar total: Wall time of the whole call.
+    """
+    __slots__ = (
+        'kind', 'query_hash', 'job_id', 'started_at', 'submit', 'polls', 'poll_wait', 'poll', 'download_bytes',
+        'parse', 'build', 'total', 'cache_hit', 'error', '_start',
+    )
+
+    def __init__(self, kind: str, query_hash: t.Optional[str] = None):
+        self.kind = kind
+        self.query_hash = query_hash
+        self.job_id: t.Optional[int] = None
+        self.started_at = time.time()
+        self.submit = 0.0
+        self.polls = 0
+        self.poll_wait = 0.0
+        self.poll = 0.0
+        self.download_bytes = 0
+        self.parse = 0.0
+        self.build = 0.0
+        self.total = 0.0
+        self.cache_hit = False
+        self.error: t.Optional[str] = None
+        self._start = time.perf_counter()
+
+    def as_dict(self) -> dict:
+        return {x: getattr(self, x) for x in self.__slots__ if not x.startswith('_')}
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{k}={v!r}' for k, v in self.as_dict().items())
+        return f'CallRecord({fields})'
+
+
+def query_hash(query_text: str) -> str:
+    """
+    Short stable identifier of a query, to correlate records without logging the query text.
+    """
+    return hashlib.sha256(' '.join(query_text.split()).encode()).hexdigest()[:16]
+
+
+def start(kind: str, query_text: t.Optional[str] = None) -> t.Optional[CallRecord]:
+    """
+    New record for a call, or None when no hook is installed.
+    """
+    if not hooks:
+        return None
+    return CallRecord(kind, query_hash(query_text) if query_text is not None else None)
+
+
+def finish(record: CallRecord, error: t.Optional[BaseException] = None) -> None:
+    """
+    Complete the record and pass it to the hooks. Failing hooks are logged and don't affect the call.
+    """
+    record.total = time.perf_counter() - record._start
+    if error is not None:
+        record.error = f'{type(error).__name__}: {error}'
+    for hook in list(hooks):
+        try:
+            hook(record)
+        except Exception:
+            logger.exception('Instrumentation hook failed')
+
+
+# Returned by `measure` while no hook is installed, reusable and free of per-call setup.
+_no_measure = contextlib.nullcontext()
+
+
+def measure(kind: str) -> t.ContextManager[t.Optional[CallRecord]]:
+    """
+    Record the wall time of a block of client-side work, eg post-processing of a result.
+    """
+    if not hooks:
+        return _no_measure
+    return _measure(kind)
+
+
+@contextlib.contextmanager
+def _measure(kind: str) -> t.Iterator[CallRecord]:
+    record = CallRecord(kind)
+    try:
+        yield record
+    except BaseException as e:
+        finish(record, e)
+        raise
+    finish(record)
+
+
+def add_hook(hook: Hook) -> Hook:
+    hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook: Hook) -> None:
+    if hook in hooks:
+        hooks.remove(hook)
+
+
+def logging_hook(log: t.Optional[logging.Logger] = None, level: int = logging.INFO) -> Hook:
+    """
+    Hook writing one log line per record.
+    """
+    log = log or logger
+
+    def hook(record: CallRecord) -> None:
+        log.log(
+            level,
+            f'{record.kind} {record.query_hash or ""} job={record.job_id} total={record.total:.3f}s '
+            f'submit={record.submit:.3f}s polls={record.polls} poll={record.poll:.3f}s '
+            f'wait={record.poll_wait:.3f}s bytes={record.download_bytes} parse={record.parse:.3f}s '
+            f'build={record.build:.3f}s cache_hit={record.cache_hit} error={record.error}'
+        )
+
+    return hook
+
+
+def span_hook(tracer: t.Any) -> Hook:
+    """
+    Hook turning records into finished spans of an OpenTelemetry-style tracer, one with
+    `start_span(name, start_time=ns)` returning spans with `set_attribute` and `end(end_time=ns)`.
+    """
+
+    def hook(record: CallRecord) -> None:
+        start_time = int(record.started_at * 1e9)
+        span = tracer.start_span(f'pylim.{record.kind}', start_time=start_time)
+        for key, value in record.as_dict().items():
+            if value is not None:
+                span.set_attribute(f'pylim.{key}', value)
+        span.end(end_time=start_time + int(record.total * 1e9))
+
+    return hook
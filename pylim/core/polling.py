@@ -0,0 +1,111 @@
+"""
+Polling policy for long running LIM jobs.
+
+Polls are spaced with exponential backoff and jitter, bounded by an overall deadline, and optionally
+follow the Retry-After hint sent by the server.
+
+Example:
+.. code-block:: python
+    >>> from pylim.core import data
+    >>> data.polling = PollingStrategy(initial_delay=1, max_delay=30, deadline=3600)
+"""
+import random
+import time
+import typing as t
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+
+class JobTimeoutError(requests.exceptions.RetryError):
+    """
+    A job didn't complete before the polling deadline. It may still be running on the server,
+    use `job_id` to collect the result later instead of resubmitting the query.
+    """
+
+    def __init__(self, message: str, job_id: t.Optional[int] = None):
+        super().__init__(message)
+        self.job_id = job_id
+
+
+class PollingStrategy:
+    """
+    :param initial_delay: Seconds to wait before the first poll.
+    :param max_delay: Upper bound of the wait between polls.
+    :param multiplier: Growth factor of the wait after each poll.
+    :param jitter: Relative random spread of each wait, 0.1 for +/-10%, so concurrent pollers don't align.
+    :param deadline: Seconds after which polling gives up, never when None.
+    :param honour_retry_after: Whether to wait as long as the server's Retry-After header asks, within max_delay.
+    """
+
+    def __init__(
+            self,
+            initial_delay: float = 0.2,
+            max_delay: float = 10.0,
+            multiplier: float = 2.0,
+            jitter: float = 0.1,
+            deadline: t.Optional[float] = 600.0,
+            honour_retry_after: bool = True,
+    ):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.jitter = jitter
+        self.deadline = deadline
+        self.honour_retry_after = honour_retry_after
+
+    def delay(self, attempt: int, retry_after: t.Optional[float] = None) -> float:
+        """
+        Seconds to wait before poll number `attempt`, counted from 0.
+
+        :param retry_after: Wait requested by the server, if any.
+        """
+        if retry_after is not None and self.honour_retry_after:
+            base = retry_after
+        else:
+            base = self.initial_delay * self.multiplier ** attempt
+        base = min(base, self.max_delay)
+        if self.jitter:
+            base *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        return max(base, 0.0)
+
+    def expires_at(self, timeout: t.Optional[float] = None) -> float:
+        """
+        Monotonic time at which polling started now gives up.
+
+        :param timeout: Overrides the deadline of the strategy.
+        """
+        timeout = self.deadline if timeout is None else timeout
+        return float('inf') if timeout is None else time.monotonic() + timeout
+
+    def wait(self, attempt: int, expires_at: float, retry_after: t.Optional[float] = None) -> bool:
+        """
+        Sleep before the next poll, cut short by the deadline.
+
+        :return: False when the deadline has passed and no further poll should be made.
+        """
+        remaining = expires_at - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(self.delay(attempt, retry_after), remaining))
+        return True
+
+
+def parse_retry_after(value: t.Optional[str]) -> t.Optional[float]:
+    """
+    Seconds to wait according to a Retry-After header, given as seconds or as an HTTP date.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
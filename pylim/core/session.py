@@ -1,4 +1,7 @@
 import logging
+import os
+import threading
+import typing as t
 from os import getenv
 from urllib.parse import urljoin
 from urllib.request import getproxies
@@ -9,6 +12,9 @@ from requests.packages.urllib3.util.retry import Retry
 
 logger = logging.getLogger(__name__)
 
+default_pool_connections = 10
+default_pool_maxsize = 10
+
 
 class BaseUrlSession(requests.Session):
     """
@@ -55,11 +61,28 @@ def raise_for_status_and_log(response: requests.Response, *args, **kwargs):
         raise
 
 
-def get_lim_session() -> requests.Session:
+def get_lim_session(
+        server: t.Optional[str] = None,
+        username: t.Optional[str] = None,
+        password: t.Optional[str] = None,
+        pool_maxsize: t.Optional[int] = None,
+        keep_alive: bool = True,
+) -> requests.Session:
     """
     HTTP Session object configured for requesting data from LIM API.
+
+    Every call builds a new session with its own connection pool. Use `get_shared_session`
+    (or a `pylim.core.Client`) to reuse connections across calls.
+
+    :param server: LIM server URL, defaults to the LIMSERVER environment variable.
+    :param username: LIM login, defaults to the LIMUSERNAME environment variable.
+    :param password: LIM password, defaults to the LIMPASSWORD environment variable.
+    :param pool_maxsize: Maximum number of connections kept open per host, defaults to `default_pool_maxsize`.
+    :param keep_alive: Whether connections are kept open between requests.
     """
     retry_adapter = HTTPAdapter(
+        pool_connections=default_pool_connections,
+        pool_maxsize=pool_maxsize or default_pool_maxsize,
         max_retries=Retry(
             total=3,
             backoff_factor=2,
@@ -68,12 +91,73 @@ def get_lim_session() -> requests.Session:
         ),
     )
     session = BaseUrlSession(
-        getenv("LIMSERVER", "https://rwe.morningstarcommodity.com"),
+        server or getenv("LIMSERVER", "https://rwe.morningstarcommodity.com"),
     )
-    session.auth = getenv("LIMUSERNAME", ""), getenv("LIMPASSWORD", "")
+    session.auth = username or getenv("LIMUSERNAME", ""), password or getenv("LIMPASSWORD", "")
     session.headers = {"Content-Type": "application/xml"}
+    if not keep_alive:
+        session.headers["Connection"] = "close"
     session.proxies = getproxies()
     session.mount("http://", retry_adapter)
     session.mount("https://", retry_adapter)
     session.hooks["response"] = raise_for_status_and_log
     return session
+
+
+_shared_session: t.Optional[requests.Session] = None
+_shared_session_pid: t.Optional[int] = None
+_shared_session_options: dict = {}
+_shared_session_lock = threading.Lock()
+
+
+def get_shared_session() -> requests.Session:
+    """
+    Process-wide HTTP session used by default for all LIM calls.
+
+    The session is created on first use and keeps its connections open, so subsequent
+    requests skip the TCP and TLS handshake. It is safe to use from several threads and
+    is rebuilt in a child process after a fork, as pooled sockets can't be shared.
+    """
+    global _shared_session, _shared_session_pid
+    session = _shared_session
+    if session is not None and _shared_session_pid == os.getpid():
+        return session
+    with _shared_session_lock:
+        if _shared_session is None or _shared_session_pid != os.getpid():
+            _shared_session = get_lim_session(**_shared_session_options)
+            _shared_session_pid = os.getpid()
+        return _shared_session
+
+
+def configure_shared_session(**options) -> None:
+    """
+    Set the options (see `get_lim_session`) used to build the shared session, e.g. `pool_maxsize=32`.
+
+    The current shared session is closed and a new one is built on next use.
+    """
+    global _shared_session_options
+    with _shared_session_lock:
+        _shared_session_options = dict(options)
+    reset_shared_session()
+
+
+def reset_shared_session() -> None:
+    """
+    Close the shared session, e.g. after changing the LIM environment variables.
+    """
+    global _shared_session, _shared_session_pid
+    with _shared_session_lock:
+        session, _shared_session, _shared_session_pid = _shared_session, None, None
+    if session is not None:
+        session.close()
+
+
+def _forget_shared_session_after_fork() -> None:
+    # Sockets belong to the parent, so drop the session without closing it.
+    global _shared_session, _shared_session_pid, _shared_session_lock
+    _shared_session, _shared_session_pid = None, None
+    _shared_session_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forget_shared_session_after_fork)
@@ -0,0 +1,146 @@
+"""
+Coalescing of concurrent identical calls.
+
+While a call for a key is in flight, other threads asking for the same key wait for it and share its
+result instead of sending their own request, so a burst of identical queries makes one LIM job.
+"""
+import asyncio
+import threading
+import typing as t
+
+R = t.TypeVar('R')
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters', 'copies')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: t.Optional[BaseException] = None
+        self.waiters = 0
+        self.copies: t.List[t.Any] = []
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time, concurrent callers of the same key get its result.
+
+    Example:
+    .. code-block:: python
+        >>> flights = SingleFlight()
+        >>> df = flights.do(query_text, lambda: fetch(query_text), copy=pd.DataFrame.copy)
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._calls: t.Dict[t.Hashable, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(
+            self, key: t.Hashable, func: t.Callable[[], R], copy: t.Optional[t.Callable[[R], R]] = None,
+    ) -> R:
+        """
+        Call `func`, or wait for the call already running for `key` and return its result.
+
+        :param copy: Makes the result handed to each waiting caller, so callers can modify their result
+                     independently. Copies are made before anyone gets the result.
+        :raises: The exception of the shared call, in every caller.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                leader = True
+                self.calls += 1
+            else:
+                call.waiters += 1
+                leader = False
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            with self._lock:
+                return call.copies.pop() if call.copies else call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                waiters = call.waiters
+            try:
+                if call.error is None and copy is not None:
+                    call.copies = [copy(call.result) for _ in range(waiters)]
+            finally:
+                call.done.set()
+        return call.result
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """
+    Runs at most one coroutine per key and event loop at a time, concurrent callers of the same key
+    await its result.
+
+    Example:
+    .. code-block:: python
+        >>> flights = AsyncSingleFlight()
+        >>> infos = await flights.do(url, lambda: fetch(url), copy=list)
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.coalesced = 0
+        self._calls: t.Dict[t.Hashable, asyncio.Future] = {}
+
+    async def do(
+            self,
+            key: t.Hashable,
+            func: t.Callable[[], t.Awaitable[R]],
+            copy: t.Optional[t.Callable[[R], R]] = None,
+    ) -> R:
+        """
+        Await `func()`, or the call already running for `key` on this loop, and return its result.
+
+        :param copy: Makes the result handed to each waiting caller.
+        :raises: The exception of the shared call, in every caller.
+        """
+        loop = asyncio.get_running_loop()
+        key = (id(loop), key)
+        future = self._calls.get(key)
+        if future is not None:
+            self.coalesced += 1
+            # Shielded so a cancelled follower doesn't cancel the shared call.
+            result = await asyncio.shield(future)
+            return copy(result) if copy is not None else result
+
+        self.calls += 1
+        future = self._calls[key] = loop.create_future()
+        try:
+            result = await func()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark the exception retrieved, there may be no follower to await it.
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+        finally:
+            del self._calls[key]
+        return result
+
+    def stats(self) -> dict:
+        return {'calls': self.calls, 'coalesced': self.coalesced, 'in_flight': len(self._calls)}
@@ -1,81 +1,337 @@
+import contextlib
+import itertools
+import json
+import os
 import re
+import threading
+import time
 import typing as t
-from datetime import date
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime
 
 import pandas as pd
+import requests
 from lxml import etree
 
+from pylim import limformula
 from pylim import limqueryutils
 from pylim import limutils
-from pylim.core import get_lim_session, query
+from pylim.core import ResultCache, TTLCache, cache, get_cache, get_shared_session, instrumentation, query, run_many
+from pylim.core.batch import default_max_workers
+from pylim.core.batching import RequestBatcher
+from pylim.core.singleflight import SingleFlight
 from pylim.limutils import is_sequence
 
 
-def series(symbols: t.Union[str, dict, tuple], start_date: t.Optional[t.Union[str, date]] = None) -> pd.DataFrame:
-    scall = symbols
-    if isinstance(scall, str):
-        scall = tuple([scall])
-    elif isinstance(scall, dict):
-        scall = tuple(scall)
-
-    # Get metadata if we have PRA symbol.
-    meta = None
-    if any([limutils.check_pra_symbol(x) for x in scall]):
-        meta = relations(*scall, show_columns=True, date_range=True)
+def _symbols_tuple(symbols: t.Union[str, dict, tuple]) -> tuple:
+    if isinstance(symbols, str):
+        return tuple([symbols])
+    elif isinstance(symbols, dict):
+        return tuple(symbols)
+    return symbols
 
-    q = limqueryutils.build_series_query(scall, meta, start_date=start_date)
-    res = query(q)
 
+def _rename_symbols(res: pd.DataFrame, symbols: t.Union[str, dict, tuple]) -> pd.DataFrame:
     if isinstance(symbols, dict):
         res = res.rename(columns=symbols)
         res.attrs['symbolmap'] = {v: k for k, v in symbols.items()}
-
     return res
 
 
-def curve(
+def series(
         symbols: t.Union[str, dict, tuple],
-        column: str = 'Close',
-        curve_dates: t.Optional[t.Union[date, t.Tuple[date, ...]]] = None,
+        start_date: t.Optional[t.Union[str, date]] = None,
+        incremental: bool = False,
+        overlap_days: int = 5,
 ) -> pd.DataFrame:
-    scall = symbols
-    if isinstance(scall, str):
-        if limqueryutils.is_formula(symbols):
-            return curve_formula(symbols, column=column, curve_dates=curve_dates)
-        scall = tuple([scall])
-    elif isinstance(scall, dict):
-        scall = tuple(scall)
+    """
+    Retrieve the history of one or more symbols.
+
+    Inside a `batch` block the call returns a Future of the DataFrame instead, see `batch`.
+
+    :param symbols: Symbol, tuple of symbols or dict of symbols to column names.
+    :param start_date: First date to retrieve, as a date, a YYYY-MM-DD string or a 'date is within' clause.
+    :param incremental: Only request the rows newer than the history already stored locally for each
+                        symbol and merge them into it. Requires the result cache, see `pylim.core.enable_cache`.
+    :param overlap_days: With `incremental`, number of days before the last stored date requested again
+                         to pick up revisions.
+    """
+    scall = _symbols_tuple(symbols)
+    if incremental:
+        res = _series_incremental(scall, start_date=start_date, overlap_days=overlap_days)
+        return _rename_symbols(res, symbols)
+
+    batcher = getattr(_batch_local, 'batcher', None)
+    if batcher is not None:
+        return batcher.submit(limqueryutils.build_when_clause(start_date), (symbols, start_date))
+    if series_batcher is not None:
+        return series_batcher.submit(limqueryutils.build_when_clause(start_date), (symbols, start_date)).result()
+    return _rename_symbols(_series(scall, start_date=start_date), symbols)
+
+
+def _series(
+        symbols: t.Tuple[str, ...], start_date: t.Optional[t.Union[str, date]] = None, use_cache: bool = True,
+) -> pd.DataFrame:
+    # Get metadata if we have PRA symbol.
+    meta = None
+    if any([limutils.check_pra_symbol(x) for x in symbols]):
+        meta = relation_info(*symbols, show_columns=True, date_range=True)
+
+    q = limqueryutils.build_series_query(symbols, meta, start_date=start_date)
+    return query(q, use_cache=use_cache)
+
 
+# Window batcher merging concurrent series calls, see enable_series_batching.
+series_batcher: t.Optional[RequestBatcher] = None
+_batch_local = threading.local()
+
+
+def _execute_series_batch(
+        when: str, items: t.List[t.Tuple[t.Union[str, dict, tuple], t.Optional[t.Union[str, date]]]],
+) -> t.List[t.Union[pd.DataFrame, Exception]]:
+    """
+    Run series calls sharing a when clause as a single query and split its result back per call.
+    If the merged query fails, each call is run on its own so one bad symbol only fails its own call.
+    """
+    calls = [_symbols_tuple(symbols) for symbols, _ in items]
+    merged = tuple(dict.fromkeys(itertools.chain.from_iterable(calls)))
+    start_date = items[0][1]
+    try:
+        res = _series(merged, start_date=start_date)
+    except Exception:
+        if len(items) == 1:
+            raise
+        results = []
+        for (symbols, _), scall in zip(items, calls):
+            try:
+                results.append(_rename_symbols(_series(scall, start_date=start_date), symbols))
+            except Exception as e:
+                results.append(e)
+        return results
+
+    results = []
+    for (symbols, _), scall in zip(items, calls):
+        part = res.reindex(columns=list(scall)).dropna(how='all')
+        if part.empty:
+            # Same as the "no data" result of an unbatched call.
+            part = pd.DataFrame()
+        part.attrs['query'] = res.attrs.get('query')
+        results.append(_rename_symbols(part, symbols))
+    return results
+
+
+@contextlib.contextmanager
+def batch(max_size: t.Optional[int] = 200) -> t.Iterator[RequestBatcher]:
+    """
+    Collect the `series` calls made in the block by this thread and run them as merged queries when
+    the block exits, one query per distinct start date. `series` returns a Future in the block.
+
+    :param max_size: Number of calls merged into one query, larger groups are split.
+
+    Example:
+    .. code-block:: python
+        >>> with lim.batch():
+        ...     futures = {symbol: lim.series(symbol) for symbol in ('FB', 'FP', 'CL')}
+        >>> frames = {symbol: f.result() for symbol, f in futures.items()}
+    """
+    previous = getattr(_batch_local, 'batcher', None)
+    batcher = _batch_local.batcher = RequestBatcher(_execute_series_batch, max_size=max_size)
+    try:
+        yield batcher
+    finally:
+        _batch_local.batcher = previous
+        batcher.flush()
+
+
+def enable_series_batching(window: float = 0.05, max_size: t.Optional[int] = 200) -> RequestBatcher:
+    """
+    Merge `series` calls made by concurrent threads within `window` seconds of each other into one query.
+    Each call still blocks and returns its own DataFrame, but waits up to `window` before its query is sent.
+    """
+    global series_batcher
+    series_batcher = RequestBatcher(_execute_series_batch, window=window, max_size=max_size)
+    return series_batcher
+
+
+def disable_series_batching() -> None:
+    global series_batcher
+    batcher, series_batcher = series_batcher, None
+    if batcher is not None:
+        batcher.flush()
+
+
+_within_re = re.compile(r'date is within (\d+) (day|week|month|year)s?', re.IGNORECASE)
+
+
+def _history_start(
+        start_date: t.Optional[t.Union[str, date]], now: t.Optional[date] = None,
+) -> t.Optional[pd.Timestamp]:
+    """
+    First date a series call with this start date asks for, Timestamp.min for the full history and None
+    for a 'date is within' clause that can't be interpreted.
+    """
+    if start_date is None:
+        return pd.Timestamp.min
+    if 'date is within' not in str(start_date).lower():
+        return pd.Timestamp(start_date)
+    m = _within_re.search(str(start_date))
+    if m is None:
+        return None
+    return pd.Timestamp(now or date.today()) - pd.DateOffset(**{f'{m.group(2).lower()}s': int(m.group(1))})
+
+
+def _load_history(result_cache: ResultCache, symbol: str) -> t.Tuple[t.Optional[pd.DataFrame], pd.Timestamp]:
+    """
+    Stored history of a symbol and the first date it was pulled from.
+    """
+    df = result_cache.load(f'series:{symbol}')
+    if df is None or not len(df):
+        return None, pd.Timestamp.max
+    start = result_cache.load(f'series-start:{symbol}')
+    # Histories stored without their start are only known to cover their own range.
+    return df, start['start'].iloc[0] if start is not None else df.index[0]
+
+
+def _store_history(result_cache: ResultCache, symbol: str, df: pd.DataFrame, start: pd.Timestamp) -> None:
+    result_cache.store(f'series:{symbol}', df)
+    result_cache.store(f'series-start:{symbol}', pd.DataFrame({'start': [start]}))
+
+
+def _series_incremental(
+        symbols: t.Tuple[str, ...], start_date: t.Optional[t.Union[str, date]] = None, overlap_days: int = 5,
+) -> pd.DataFrame:
+    result_cache = get_cache()
+    if result_cache is None:
+        raise ValueError('Incremental series need the result cache, enable it with pylim.core.enable_cache()')
+
+    first_date = _history_start(start_date)
+    stored, existing = {}, {}
+    for symbol in symbols:
+        df, start = _load_history(result_cache, symbol)
+        if df is None:
+            continue
+        existing[symbol] = (df, start)
+        # A stored history pulled from a later date can't be extended backwards.
+        if first_date is not None and start <= first_date:
+            stored[symbol] = (df, start)
+
+    fetch_start = start_date
+    if len(stored) == len(symbols):
+        last_date = min(df.index[-1] for df, _ in stored.values())
+        fetch_start = (last_date - pd.Timedelta(days=overlap_days)).date()
+    new = _series(symbols, start_date=fetch_start, use_cache=False)
+
+    merged = []
+    for symbol in symbols:
+        s = new[[symbol]].dropna() if symbol in new.columns else pd.DataFrame(columns=[symbol], dtype=float)
+        if symbol in stored:
+            # Newly downloaded values take precedence over stored ones to pick up revisions.
+            s, start = s.combine_first(stored[symbol][0]), stored[symbol][1]
+            _store_history(result_cache, symbol, s, start)
+        elif first_date is not None:
+            _store_history(result_cache, symbol, s, first_date)
+        elif symbol in existing:
+            # The start of the window is unknown, it can only extend a stored history it overlaps.
+            df, start = existing[symbol]
+            if len(s) and s.index[0] <= df.index[-1]:
+                _store_history(result_cache, symbol, s.combine_first(df), start)
+        elif len(s):
+            _store_history(result_cache, symbol, s, s.index[0])
+        merged.append(s)
+
+    res = pd.concat(merged, axis=1)
+    if first_date is not None and first_date != pd.Timestamp.min:
+        res = res[res.index >= first_date]
+    res.attrs['query'] = new.attrs.get('query')
+    return res
+
+
+def series_many(
+        symbols_list: t.Iterable[t.Union[str, dict, tuple]],
+        start_date: t.Optional[t.Union[str, date]] = None,
+        max_workers: int = default_max_workers,
+        rate_limit: t.Optional[float] = None,
+) -> t.List[t.Union[pd.DataFrame, Exception]]:
+    """
+    Call `series` for each entry of `symbols_list` in parallel.
+
+    :return: Results in input order, a failed call has its exception in place of the DataFrame.
+    """
+    return run_many(
+        lambda symbols: series(symbols, start_date=start_date), symbols_list,
+        max_workers=max_workers, rate_limit=rate_limit,
+    )
+
+
+def _curve_query(
+        symbols: t.Tuple[str, ...],
+        column: str = 'Close',
+        curve_dates: t.Optional[t.Union[date, t.Tuple[date, ...]]] = None,
+) -> str:
     if curve_dates is not None:
         if not is_sequence(curve_dates):
             curve_dates = (curve_dates,)
-        q = limqueryutils.build_curve_history_query(scall, curve_dates, column)
-    else:
-        if is_sequence(curve_dates) and len(curve_dates):
-            curve_date = curve_dates[0]
-        else:
-            curve_date = curve_dates
-        q = limqueryutils.build_curve_query({x: 'FUTURES' for x in scall}, curve_date, column)
-    res = query(q)
+        return limqueryutils.build_curve_history_query(symbols, curve_dates, column)
+    return limqueryutils.build_curve_query({x: 'FUTURES' for x in symbols}, None, column)
 
-    if isinstance(symbols, dict):
-        res = res.rename(columns=symbols)
-        res.attrs['symbolmap'] = {v: k for k, v in symbols.items()}
+
+def _curve_result(res: pd.DataFrame, symbols: t.Union[str, dict, tuple]) -> t.Optional[pd.DataFrame]:
+    res = _rename_symbols(res, symbols)
 
     # Reindex dates to start of month.
     if res is not None and len(res) > 0:
-        res = res.resample('MS').mean()
+        with instrumentation.measure('resample'):
+            res = res.resample('MS').mean()
         return res
 
 
+def curve(
+        symbols: t.Union[str, dict, tuple],
+        column: str = 'Close',
+        curve_dates: t.Optional[t.Union[date, t.Tuple[date, ...]]] = None,
+) -> pd.DataFrame:
+    if isinstance(symbols, str) and limqueryutils.is_formula(symbols):
+        return curve_formula(symbols, column=column, curve_dates=curve_dates)
+
+    q = _curve_query(_symbols_tuple(symbols), column, curve_dates)
+    res = query(q)
+    return _curve_result(res, symbols)
+
+
+def curve_many(
+        symbols_list: t.Iterable[t.Union[str, dict, tuple]],
+        column: str = 'Close',
+        curve_dates: t.Optional[t.Union[date, t.Tuple[date, ...]]] = None,
+        max_workers: int = default_max_workers,
+        rate_limit: t.Optional[float] = None,
+) -> t.List[t.Union[pd.DataFrame, Exception]]:
+    """
+    Call `curve` for each entry of `symbols_list` (symbols or formulas) in parallel.
+
+    :return: Results in input order, a failed call has its exception in place of the DataFrame.
+    """
+    return run_many(
+        lambda symbols: curve(symbols, column=column, curve_dates=curve_dates), symbols_list,
+        max_workers=max_workers, rate_limit=rate_limit,
+    )
+
+
 def curve_formula(
         formula: str,
         column: str = 'Close',
         curve_dates: t.Optional[t.Tuple[date, ...]] = None,
-        matches: t.Optional[t.Tuple[str, ...]] = None
+        matches: t.Optional[t.Tuple[str, ...]] = None,
+        dates_per_query: int = 20,
 ) -> pd.DataFrame:
     """
     Calculate a forward curve using existing symbols.
+
+    :param formula: Formula of symbols, e.g. 'Show 1: FP/7.45-FB'.
+    :param column: Column of the symbols to use.
+    :param curve_dates: Curve date(s), the latest curve when None. Several dates are retrieved together,
+                        `dates_per_query` at a time, and return one column per date.
+    :param matches: Symbols of the formula and their types, looked up when None.
+    :param dates_per_query: Maximum number of curve dates requested in one query.
     """
     if matches is None:
         matches = find_symbols_in_query(formula)
@@ -85,32 +341,55 @@ def curve_formula(
         q = limqueryutils.build_curve_query(symbols=matches, curve_date=curve_dates, column=column,
                                             curve_formula_str=formula)
         res = query(q)
-        res = res.resample('MS').mean()
+        with instrumentation.measure('resample'):
+            res = res.resample('MS').mean()
         # lim query language can't calculate a formula with a forward curve and spot value
-        # to get past this, calculate the formula result using eval(), given a dataframe of formula components
+        # to get past this, calculate the formula result client-side, given a dataframe of formula components
         if 'NORMAL' in matches.values():
-            p = formula.replace("Show 1:", "")
-            for symbol in find_symbols_in_query(p):
-                p = re.sub(fr"\b{symbol}\b", fr"x.{symbol}", p)
-            res['1'] = res.apply(lambda x: eval(p), axis=1)
+            res['1'] = limformula.compile_formula(formula).evaluate(res)
         if isinstance(curve_dates, date):
             res = res.rename(columns={'1': curve_dates.strftime("%Y/%m/%d")})
     else:
         dfs, res = [], None
         if not is_sequence(curve_dates):
             curve_dates = [curve_dates]
-        for d in curve_dates:
-            rx = curve_formula(formula, column=column, curve_dates=(d,), matches=matches)
+        for i in range(0, len(curve_dates), dates_per_query):
+            rx = _curve_formula_dates(formula, matches, curve_dates[i:i + dates_per_query], column)
             if rx is not None:
-                rx = rx[[d.strftime("%Y/%m/%d")]]
                 dfs.append(rx)
         if len(dfs) > 0:
-            res = pd.concat(dfs, 1)
+            res = pd.concat(dfs, axis=1)
             res = res.dropna(how='all', axis=0)
 
     return res
 
 
+def _curve_formula_dates(
+        formula: str, matches: t.Dict[str, str], curve_dates: t.Sequence[date], column: str = 'Close',
+) -> t.Optional[pd.DataFrame]:
+    """
+    Forward curves of a formula for several curve dates, retrieved with a single query.
+    """
+    q = limqueryutils.build_curve_formula_history_query(formula, matches, curve_dates, column)
+    res = query(q)
+    if res is None or len(res) == 0:
+        return None
+    with instrumentation.measure('resample'):
+        res = res.resample('MS').mean()
+    labels = [d.strftime("%Y/%m/%d") for d in curve_dates]
+    if 'NORMAL' not in matches.values():
+        return res[[x for x in labels if x in res.columns]]
+
+    # The query returned the formula components, evaluate the formula for each curve date.
+    compiled = limformula.compile_formula(formula)
+    out = {}
+    for counter, label in enumerate(labels, start=1):
+        columns = {x: f'{x}_{counter}' if matches[x] == 'FUTURES' else x for x in matches}
+        if all(x in res.columns for x in columns.values()):
+            out[label] = compiled.evaluate(res, columns=columns)
+    return pd.DataFrame(out, index=res.index)
+
+
 def query_as_curve(query_text: str) -> pd.DataFrame:
     """
     Given a LIM query that returns a curve, format the return (drop NaN).
@@ -118,7 +397,8 @@ def query_as_curve(query_text: str) -> pd.DataFrame:
     :param query: A MorningStar LIM query text.
     """
     df = query(query_text)
-    df = df.resample('MS').mean()
+    with instrumentation.measure('resample'):
+        df = df.resample('MS').mean()
     df = df.dropna()
     return df
 
@@ -139,21 +419,33 @@ def continuous_futures_rollover(
 def _contracts(
         formula: str,
         matches: t.Tuple[str, ...],
-        contracts_list: t.Tuple[str, ...],
+        contracts_list: t.Union[t.Tuple[str, ...], limutils.ContractIndex],
         start_date: t.Optional[date] = None,
+        chunk_size: t.Optional[int] = None,
+        max_workers: int = default_max_workers,
+        retries: int = 2,
+        progress: t.Optional[t.Callable[[int, int], None]] = None,
 ) -> pd.DataFrame:
-    s = []
-    for match in matches:
-        r = [x.split('_')[-1] for x in contracts_list if match in x]
-        s.append(set(r))
+    if not isinstance(contracts_list, limutils.ContractIndex):
+        contracts_list = limutils.ContractIndex(contracts_list)
+    # Contract codes are YYYY followed by the month code, month codes sort in calendar order.
+    common_contacts = contracts_list.common_codes(matches)
 
-    common_contacts = list(set(s[0].intersection(*s)))
+    def run(chunk: t.List[str]) -> pd.DataFrame:
+        q = limqueryutils.build_futures_contracts_formula_query(
+            formula, matches=matches, contracts=chunk, start_date=start_date
+        )
+        return query(q)
 
-    q = limqueryutils.build_futures_contracts_formula_query(
-        formula, matches=matches, contracts=common_contacts, start_date=start_date
-    )
-    df = query(q)
-    return df
+    if not chunk_size or len(common_contacts) <= chunk_size:
+        return run(common_contacts)
+
+    chunks = [common_contacts[i:i + chunk_size] for i in range(0, len(common_contacts), chunk_size)]
+    results = run_many(run, chunks, max_workers=max_workers, retries=retries, progress=progress)
+    for res in results:
+        if isinstance(res, Exception):
+            raise res
+    return pd.concat(results, axis=1, sort=True)
 
 
 def contracts(
@@ -163,13 +455,29 @@ def contracts(
         months: t.Optional[t.Tuple[str, ...]] = None,
         start_date: t.Optional[date] = None,
         monthly_contracts_only:bool = True,
+        chunk_size: t.Optional[int] = None,
+        max_workers: int = default_max_workers,
+        retries: int = 2,
+        progress: t.Optional[t.Callable[[int, int], None]] = None,
 ) -> pd.DataFrame:
+    """
+    Formula evaluated on each futures contract, one column per contract.
+
+    :param chunk_size: Split the contracts into queries of at most this many contracts, run concurrently and
+                       merged. One query for all contracts when None.
+    :param max_workers: Maximum number of chunk queries in flight at the same time.
+    :param retries: Number of times a failed chunk query is retried before the call raises.
+    :param progress: Called with the number of finished chunks and the total after each chunk.
+    """
     matched_futures = tuple(
         symbol for symbol, type in find_symbols_in_query(formula).items() if type == "FUTURES"
     )
     contracts_list = get_symbol_contract_list(*matched_futures, monthly_contracts_only=monthly_contracts_only)
-    contracts_list = limutils.filter_contracts(contracts_list, start_year=start_year, end_year=end_year, months=months)
-    return _contracts(formula, matches=matched_futures, contracts_list=contracts_list, start_date=start_date)
+    contracts_list = limutils.ContractIndex(contracts_list).filter(start_year=start_year, end_year=end_year, months=months)
+    return _contracts(
+        formula, matches=matched_futures, contracts_list=contracts_list, start_date=start_date,
+        chunk_size=chunk_size, max_workers=max_workers, retries=retries, progress=progress,
+    )
 
 
 def structure(symbol: str, mx: int, my: int, start_date: t.Optional[date] = None) -> pd.DataFrame:
@@ -204,6 +512,8 @@ def relations(
         desc: bool = False,
         date_range: bool = False,
         shorthand: bool = False,
+        session: t.Optional[requests.Session] = None,
+        use_cache: bool = True,
 ) -> pd.DataFrame:
     """
     Allows you to retrieve schema (metadata) information about MorningStar LIM relations.
@@ -215,7 +525,215 @@ def relations(
     :param date_range: Whether the response provides data-range dates information for each column.
     :param shorthand: Whether the response disables field value population for child relations to
                       accelerate the meta-data fetch process. This flag works only with `show_children=True`.
+    :param session: HTTP session to send the request with, defaults to the shared pooled session.
+    :param use_cache: Whether to serve symbols from `relations_cache` and only request the others.
+    :raises requests.HTTPError: 404 when none of the symbols is a known relation. Unknown symbols are
+                                left out when some others are known.
+    """
+    flags = (show_children, show_columns, desc, date_range, shorthand)
+    infos = _relation_infos(symbols, flags, session=session, use_cache=use_cache)
+    return limutils.relations_frame(infos, show_children=show_children, date_range=date_range)
+
+
+def relation_info(
+        *symbols: str,
+        show_children: bool = False,
+        show_columns: bool = False,
+        desc: bool = False,
+        date_range: bool = False,
+        shorthand: bool = False,
+        session: t.Optional[requests.Session] = None,
+        use_cache: bool = True,
+) -> t.Dict[str, limutils.RelationInfo]:
+    """
+    Same as `relations` but returns lightweight `RelationInfo` records by relation name instead of a
+    DataFrame, for callers that only need a few fields. Unknown relations are left out, and a 404
+    HTTPError is raised when none is known.
+    """
+    flags = (show_children, show_columns, desc, date_range, shorthand)
+    return {x.name: x for x in _relation_infos(symbols, flags, session=session, use_cache=use_cache)}
+
+
+def _relation_infos(
+        symbols: t.Sequence[str], flags: tuple, session: t.Optional[requests.Session] = None, use_cache: bool = True,
+) -> t.List[limutils.RelationInfo]:
+    if not use_cache:
+        return _found_relations(symbols, _fetch_relations(symbols, flags, session=session))
+
+    names, infos, missing = _cached_relation_infos(symbols, flags)
+    if missing:
+        try:
+            fetched = _fetch_relations(missing, flags, session=session)
+        except requests.HTTPError as e:
+            if not _is_not_found(e):
+                raise
+            fetched = []
+        infos += _cache_fetched_relations(missing, flags, fetched)
+    return _found_relations(names, infos)
+
+
+def _cached_relation_infos(
+        symbols: t.Sequence[str], flags: tuple,
+) -> t.Tuple[t.List[str], t.List[limutils.RelationInfo], t.List[str]]:
+    """
+    Requested names, the cached infos of the known ones and the names missing from the cache.
+    """
+    names = list(dict.fromkeys(x for symbol in symbols for x in symbol.split(',')))
+    infos, missing = [], []
+    for name in names:
+        info = _get_cached_relation(name, flags)
+        if info is _not_cached:
+            missing.append(name)
+        elif info is not None:
+            infos.append(info)
+    return names, infos, missing
+
+
+def _cache_fetched_relations(
+        missing: t.List[str], flags: tuple, fetched: t.List[limutils.RelationInfo],
+) -> t.List[limutils.RelationInfo]:
+    fetched_names = [x.name for x in fetched]
+    for name in missing:
+        # Results are named after the last element of a path.
+        count = fetched_names.count(name.split(':')[-1])
+        if count == 0:
+            _set_cached_relation(name, flags, None)
+        elif count == 1:
+            _set_cached_relation(name, flags, fetched[fetched_names.index(name.split(':')[-1])])
+    return fetched
+
+
+def _is_not_found(error: requests.HTTPError) -> bool:
+    # LIM answers 404 when none of the names exists, the call only fails if nothing else resolved.
+    return error.response is not None and error.response.status_code == 404
+
+
+def _found_relations(
+        symbols: t.Sequence[str], infos: t.List[limutils.RelationInfo],
+) -> t.List[limutils.RelationInfo]:
+    if not infos:
+        response = requests.Response()
+        response.status_code = 404
+        raise requests.HTTPError(
+            f'404 LIM Client Error: No relations found for {", ".join(symbols)}', response=response,
+        )
+    return infos
+
+
+_not_cached = object()
+
+# Schema metadata of single relations, keyed by (name, request flags). None marks unknown names.
+relations_cache = TTLCache(maxsize=4096, ttl=600)
+# Optional second tier shared between processes, see `enable_relations_disk_cache`.
+relations_disk_cache: t.Optional[ResultCache] = None
+# Relations requests in flight, see `_fetch_relations`.
+relations_flights = SingleFlight()
+
+
+def _relations_disk_key(name: str, flags: tuple) -> str:
+    return relations_disk_cache.key(f'relinfo:{name}:{flags}')
+
+
+def _get_cached_relation(name: str, flags: tuple) -> t.Any:
+    info = relations_cache.get((name, flags), _not_cached)
+    if info is _not_cached and relations_disk_cache is not None:
+        info = relations_disk_cache.get(_relations_disk_key(name, flags))
+        if info is None:
+            return _not_cached
+        relations_cache.set((name, flags), info)
+    return info
+
+
+def _set_cached_relation(name: str, flags: tuple, info: t.Optional[limutils.RelationInfo]) -> None:
+    relations_cache.set((name, flags), info)
+    if info is not None and relations_disk_cache is not None:
+        relations_disk_cache.put(_relations_disk_key(name, flags), info)
+
+
+def invalidate_relations(*symbols: str) -> None:
     """
+    Drop the cached metadata of the given relations, or of all relations when none are given.
+    """
+    names = {x for symbol in symbols for x in symbol.split(',')}
+    if not names:
+        relations_cache.invalidate()
+        contract_lists_cache.invalidate()
+        if relations_disk_cache is not None:
+            relations_disk_cache.clear()
+        return
+    relations_cache.invalidate(lambda key: key[0] in names)
+    contract_lists_cache.invalidate(lambda key: key in names)
+    if relations_disk_cache is not None:
+        for name in names:
+            for flags in itertools.product((False, True), repeat=5):
+                relations_disk_cache.invalidate(_relations_disk_key(name, flags))
+
+
+def enable_relations_disk_cache(
+        directory: t.Optional[str] = None, ttl: t.Optional[float] = 24 * 3600,
+) -> ResultCache:
+    """
+    Keep relations metadata on disk as well, so it is shared between processes and survives restarts.
+
+    :param directory: Cache directory, defaults to a 'relations' folder in the result cache directory.
+    :param ttl: Maximum age of an entry in seconds.
+    """
+    global relations_disk_cache
+    directory = directory or os.path.join(os.getenv('LIMCACHEDIR', cache.default_directory), 'relations')
+    relations_disk_cache = ResultCache(directory, ttl=ttl, fmt='pickle')
+    return relations_disk_cache
+
+
+def _fetch_relations(
+        symbols: t.Sequence[str], flags: tuple, session: t.Optional[requests.Session] = None,
+) -> t.List[limutils.RelationInfo]:
+    # Identical requests running at the same time share one call, the request URL lists the names as a set.
+    return relations_flights.do(
+        (frozenset(symbols), flags, session),
+        lambda: _request_relations(symbols, flags, session=session),
+        copy=list,
+    )
+
+
+def _request_relations(
+        symbols: t.Sequence[str], flags: tuple, session: t.Optional[requests.Session] = None,
+) -> t.List[limutils.RelationInfo]:
+    show_children, show_columns, desc, date_range, shorthand = flags
+    url, params = _relations_request(
+        *symbols, show_children=show_children, show_columns=show_columns, desc=desc, date_range=date_range,
+        shorthand=shorthand,
+    )
+    session = session or get_shared_session()
+    record = instrumentation.start('relations', f'{url}?{sorted(params.items())}')
+    try:
+        start = time.perf_counter()
+        response = session.get(url, params=params)
+        if record is not None:
+            record.submit = time.perf_counter() - start
+            record.download_bytes = len(response.content)
+            start = time.perf_counter()
+        infos = limutils.parse_relations(
+            etree.fromstring(response.content), show_children=show_children, date_range=date_range,
+        )
+        if record is not None:
+            record.parse = time.perf_counter() - start
+    except Exception as e:
+        if record is not None:
+            instrumentation.finish(record, e)
+        raise
+    if record is not None:
+        instrumentation.finish(record)
+    return infos
+
+
+def _relations_request(
+        *symbols: str,
+        show_children: bool = False,
+        show_columns: bool = False,
+        desc: bool = False,
+        date_range: bool = False,
+        shorthand: bool = False,
+) -> t.Tuple[str, dict]:
     symbols_encoded = ','.join(set(symbols))
     url = f'/rs/api/schema/relations/{symbols_encoded}'
     params = {
@@ -225,62 +743,172 @@ def relations(
         'dateRange': str(date_range).lower(),
         'shorthand': str(shorthand).lower()
     }
-    with get_lim_session() as session:
-        response = session.get(url, params=params)
-    root = etree.fromstring(response.content)
-    df = pd.concat([pd.Series(x.values(), index=x.attrib) for x in root], axis=1, sort=False)
-    if show_children:
-        df = limutils.relinfo_children(df, root)
-    if date_range:
-        df = limutils.relinfo_daterange(df, root)
-    # Make symbol names the header.
-    df.columns = df.loc['name']
-    return df
+    return url, params
+
 
+def _relations_frame(content: bytes, show_children: bool = False, date_range: bool = False) -> pd.DataFrame:
+    infos = limutils.parse_relations(etree.fromstring(content), show_children=show_children, date_range=date_range)
+    return limutils.relations_frame(infos, show_children=show_children, date_range=date_range)
 
-def find_symbols_in_path(path: str, type:str=None) -> list:
+
+def find_symbols_in_path(path: str, type: str = None, **kwargs) -> list:
     """
     Given a path in the LIM tree hierarchy, find all symbols in that path.
+
+    See `iter_symbols_in_path` for the keyword arguments.
     """
-    symbols = []
-    df = relations(path, show_children=True)
-
-    for col in df.columns:
-        children = df[col]['children']
-        for _, row in children.iterrows():
-            if type is not None:
-                if row.type == type:
-                    symbols.append(row['name'])
-            else:
-                if row.type == 'FUTURES' or row.type == 'NORMAL':
-                    symbols.append(row['name'])
-            if row.type == 'CATEGORY':
-                    rec_symbols = find_symbols_in_path(f'{path}:{row["name"]}', type=type)
-                    symbols = symbols + rec_symbols
-    return symbols
+    return list(iter_symbols_in_path(path, type=type, **kwargs))
+
+
+def iter_symbols_in_path(
+        path: str,
+        type: str = None,
+        max_workers: int = 4,
+        batch_size: int = 20,
+        state_file: t.Optional[str] = None,
+) -> t.Iterator[str]:
+    """
+    Walk a path in the LIM tree hierarchy breadth-first and yield the symbols found in it.
+
+    Sibling categories are requested together in one `relations` call and the calls of a level run
+    concurrently.
+
+    :param path: Path to walk, e.g. 'TopRelation:Futures:Ipe'.
+    :param type: Relation type to yield, FUTURES and NORMAL relations when None.
+    :param max_workers: Maximum number of `relations` calls in flight.
+    :param batch_size: Maximum number of category paths per `relations` call.
+    :param state_file: JSON file the crawl progress is saved to after every call. When it exists, the
+                       crawl resumes from it instead of starting over, and it is deleted once the walk completes.
+                       Symbols of a call interrupted midway are yielded again on resume.
+    """
+    types = {type} if type is not None else {'FUTURES', 'NORMAL'}
+    pending = [path]
+    if state_file is not None and os.path.exists(state_file):
+        with open(state_file) as f:
+            state = json.load(f)
+        if state['path'] == path:
+            pending = state['pending']
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending:
+            batches = _category_batches(pending, batch_size)
+            futures = {
+                executor.submit(relation_info, *batch, show_children=True): i for i, batch in enumerate(batches)
+            }
+            next_level = []
+            # Results are handled as the calls complete, so a slow call doesn't hold back the others.
+            for future in as_completed(futures):
+                i = futures.pop(future)
+                infos = future.result()
+                for category in batches[i]:
+                    info = infos.get(category.split(':')[-1])
+                    if info is None or info.children is None:
+                        continue
+                    for child, child_type in info.children:
+                        if child_type in types:
+                            yield child
+                        if child_type == 'CATEGORY':
+                            next_level.append(f'{category}:{child}')
+                if state_file is not None:
+                    remaining = [x for j in sorted(futures.values()) for x in batches[j]] + next_level
+                    _save_crawl_state(state_file, {'path': path, 'pending': remaining})
+            pending = next_level
+
+    if state_file is not None and os.path.exists(state_file):
+        os.remove(state_file)
+
+
+def _category_batches(paths: t.List[str], batch_size: int) -> t.List[t.List[str]]:
+    """
+    Group paths so no batch holds two paths with the same last element, as relations() names results by it.
+    """
+    batches, names = [], []
+    for path in paths:
+        name = path.split(':')[-1]
+        for batch, batch_names in zip(batches, names):
+            if len(batch) < batch_size and name not in batch_names:
+                batch.append(path)
+                batch_names.add(name)
+                break
+        else:
+            batches.append([path])
+            names.append({name})
+    return batches
+
+
+def _save_crawl_state(state_file: str, state: dict) -> None:
+    tmp_file = f'{state_file}.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp_file, state_file)
+
+
+# Child contracts of futures roots, keyed by root. Entries expire when the contracts roll at the month start.
+contract_lists_cache = TTLCache(maxsize=1024, ttl=None)
+_monthly_contract_re = re.compile(r'\d\d\d\d\w')
+
+
+def _seconds_to_next_roll(now: t.Optional[datetime] = None) -> float:
+    now = now or datetime.now()
+    next_roll = datetime(now.year + now.month // 12, now.month % 12 + 1, 1)
+    return (next_roll - now).total_seconds()
+
+
+def get_contract_lists(*symbols: str, use_cache: bool = True) -> t.Dict[str, t.List[str]]:
+    """
+    Futures contracts of each root symbol, fetched for all uncached roots in one relations call.
+
+    :param use_cache: Whether to serve roots from `contract_lists_cache` and only request the others.
+    :return: Contract names by root, empty for roots without children. The lists are the caller's own.
+    """
+    lists = {}
+    missing = []
+    for symbol in dict.fromkeys(symbols):
+        contracts_list = contract_lists_cache.get(symbol) if use_cache else None
+        if contracts_list is None:
+            missing.append(symbol)
+        else:
+            lists[symbol] = list(contracts_list)
+
+    if missing:
+        infos = relation_info(*missing, show_children=True, shorthand=True, use_cache=False)
+        ttl = _seconds_to_next_roll()
+        for symbol in missing:
+            # Results are named after the last element of a path.
+            info = infos.get(symbol.split(':')[-1])
+            contracts_list = [name for name, _ in info.children] if info and info.children is not None else []
+            # Cached as a tuple and handed out as copies, so callers can't change the cached lists.
+            contract_lists_cache.set(symbol, tuple(contracts_list), ttl=ttl)
+            lists[symbol] = contracts_list
+    return lists
 
 
 def get_symbol_contract_list(
         *symbols: str,
         monthly_contracts_only: bool = False,
+        use_cache: bool = True,
 ) -> list:
     """
     Given a symbol pull all futures contracts related to it.
+
+    :param use_cache: Whether to reuse contract lists fetched earlier in the month, see `get_contract_lists`.
     """
-    response = relations(*symbols, show_children=True, shorthand=True).T
-    response = response[(response.hasChildren == '1') & (pd.notnull(response.children))].T
-    children = response.loc['children']
-    children = pd.concat(children.values)
-    contracts_list = list(children.name.values)
+    lists = get_contract_lists(*symbols, use_cache=use_cache)
+    contracts_list = [c for symbol in dict.fromkeys(symbols) for c in lists[symbol]]
     if monthly_contracts_only:
-        contracts_list = [c for c in contracts_list if re.findall(r'\d\d\d\d\w', c)]
+        contracts_list = [c for c in contracts_list if _monthly_contract_re.search(c)]
     return contracts_list
 
 
 def find_symbols_in_query(query: str) -> dict:
-    m = re.findall(r'\w[a-zA-Z0-9_.]{0,}', query)
-    if 'Show' in m:
-        m.remove('Show')
+    """
+    Find the FUTURES and NORMAL relations used in a query, futures first.
+
+    Only the identifiers left by the local tokenizer are checked with LIM, through the relations cache.
+    """
+    m = limqueryutils.find_symbol_candidates(query)
+    if len(m) == 0:
+        return {}
     rel = relations(*m).T
     rel = rel[rel['type'].isin(['FUTURES', 'NORMAL'])]
     rel = rel.sort_values('type')  # sort to have futures first which is useful for building queries
@@ -0,0 +1,118 @@
+"""
+Async versions of the `pylim.lim` entry points, so one event loop can keep many LIM jobs in flight.
+
+Example:
+.. code-block:: python
+    >>> async def main():
+    ...     async with AsyncClient(max_concurrency=20) as client:
+    ...         return await asyncio.gather(*(limasync.aseries(s, client=client) for s in symbols))
+"""
+import asyncio
+import functools
+import typing as t
+from datetime import date
+
+import pandas as pd
+import requests
+from lxml import etree
+
+from pylim import lim
+from pylim import limqueryutils
+from pylim import limutils
+from pylim.core.aio import AsyncClient, aquery, get_async_client
+from pylim.core.singleflight import AsyncSingleFlight
+
+
+async def aseries(
+        symbols: t.Union[str, dict, tuple],
+        start_date: t.Optional[t.Union[str, date]] = None,
+        client: t.Optional[AsyncClient] = None,
+) -> pd.DataFrame:
+    scall = lim._symbols_tuple(symbols)
+
+    # Get metadata if we have PRA symbol.
+    meta = None
+    if any([limutils.check_pra_symbol(x) for x in scall]):
+        flags = (False, True, False, True, False)
+        meta = {x.name: x for x in await _arelation_infos(scall, flags, client=client)}
+
+    q = limqueryutils.build_series_query(scall, meta, start_date=start_date)
+    res = await aquery(q, client=client)
+    return lim._rename_symbols(res, symbols)
+
+
+async def acurve(
+        symbols: t.Union[str, dict, tuple],
+        column: str = 'Close',
+        curve_dates: t.Optional[t.Union[date, t.Tuple[date, ...]]] = None,
+        client: t.Optional[AsyncClient] = None,
+) -> pd.DataFrame:
+    if isinstance(symbols, str) and limqueryutils.is_formula(symbols):
+        # Formula curves need several dependent round trips, run them on the sync path in a worker thread.
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, functools.partial(lim.curve_formula, symbols, column=column, curve_dates=curve_dates)
+        )
+
+    q = lim._curve_query(lim._symbols_tuple(symbols), column, curve_dates)
+    res = await aquery(q, client=client)
+    return lim._curve_result(res, symbols)
+
+
+async def arelations(
+        *symbols: str,
+        show_children: bool = False,
+        show_columns: bool = False,
+        desc: bool = False,
+        date_range: bool = False,
+        shorthand: bool = False,
+        client: t.Optional[AsyncClient] = None,
+        use_cache: bool = True,
+) -> pd.DataFrame:
+    """
+    Async version of `pylim.lim.relations`, sharing its `relations_cache`.
+    """
+    flags = (show_children, show_columns, desc, date_range, shorthand)
+    infos = await _arelation_infos(symbols, flags, client=client, use_cache=use_cache)
+    return limutils.relations_frame(infos, show_children=show_children, date_range=date_range)
+
+
+async def _arelation_infos(
+        symbols: t.Sequence[str], flags: tuple, client: t.Optional[AsyncClient] = None, use_cache: bool = True,
+) -> t.List[limutils.RelationInfo]:
+    # Same as `lim._relation_infos`, with the request awaited.
+    if not use_cache:
+        return lim._found_relations(symbols, await _afetch_relations(symbols, flags, client=client))
+
+    names, infos, missing = lim._cached_relation_infos(symbols, flags)
+    if missing:
+        try:
+            fetched = await _afetch_relations(missing, flags, client=client)
+        except requests.HTTPError as e:
+            if not lim._is_not_found(e):
+                raise
+            fetched = []
+        infos += lim._cache_fetched_relations(missing, flags, fetched)
+    return lim._found_relations(names, infos)
+
+
+# Relations requests in flight, see `_afetch_relations`.
+relations_flights = AsyncSingleFlight()
+
+
+async def _afetch_relations(
+        symbols: t.Sequence[str], flags: tuple, client: t.Optional[AsyncClient] = None,
+) -> t.List[limutils.RelationInfo]:
+    show_children, show_columns, desc, date_range, shorthand = flags
+    client = client or get_async_client()
+
+    async def fetch() -> t.List[limutils.RelationInfo]:
+        url, params = lim._relations_request(
+            *symbols, show_children=show_children, show_columns=show_columns, desc=desc, date_range=date_range,
+            shorthand=shorthand,
+        )
+        content, _ = await client.request('GET', url, params=params)
+        return limutils.parse_relations(etree.fromstring(content), show_children=show_children, date_range=date_range)
+
+    # Identical requests awaited at the same time share one call, the request URL lists the names as a set.
+    return await relations_flights.do((frozenset(symbols), flags, client), fetch, copy=list)
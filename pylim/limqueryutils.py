@@ -49,6 +49,67 @@ class LimQueryBuilder:
         )
 
 
+# Words of the LIM query language that are never relation names.
+query_keywords = {
+    'after', 'ago', 'and', 'attr', 'before', 'date', 'day', 'days', 'defined', 'else', 'endif', 'from', 'if',
+    'in', 'is', 'last', 'let', 'month', 'months', 'not', 'of', 'on', 'or', 'previous', 'show', 'then', 'to',
+    'undefined', 'week', 'weeks', 'when', 'within', 'year', 'years', '%exec',
+}
+query_functions = {
+    'forward_curve', 'abs', 'avg', 'exp', 'log', 'max', 'min', 'round', 'sqrt', 'sum',
+}
+
+_token_re = re.compile(r"""
+    (?P<string>"[^"]*")
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?(?![\w.]))
+    | (?P<identifier>%?\w[\w.]*)
+    | (?P<operator>\S)
+""", re.VERBOSE)
+
+
+def tokenize(query: str) -> t.List[t.Tuple[str, str]]:
+    """
+    Split LIM query text into (kind, text) tokens, kind being string, number, identifier or operator.
+    """
+    return [(m.lastgroup, m.group()) for m in _token_re.finditer(query)]
+
+
+def find_symbol_candidates(query: str) -> t.List[str]:
+    """
+    Identifiers of a LIM query that may be relation names, in order of appearance.
+
+    Literals, keywords, directives (%x), function names, attributes (@x), Show labels (x:), assignments and
+    keyword arguments (x =) and column names (x of y) are dropped, so only these need checking with LIM.
+    """
+    tokens = tokenize(query)
+    candidates = {}
+    for i, (kind, text) in enumerate(tokens):
+        if kind != 'identifier':
+            continue
+        previous = tokens[i - 1][1] if i > 0 else None
+        following = tokens[i + 1][1] if i + 1 < len(tokens) else None
+        if text.lower() in query_keywords or previous == '@' or text.startswith('%'):
+            continue
+        if following == '(' and text.lower() in query_functions:
+            continue
+        if following in {':', '='} or (following is not None and following.lower() == 'of'):
+            continue
+        candidates[text] = None
+    return list(candidates)
+
+
+def substitute_symbols(query: str, replacements: t.Dict[str, str]) -> str:
+    """
+    Replace whole identifiers of a query, e.g. FB but not FB_2020F or NYMEX.FB.
+    """
+    def replace(match: t.Match) -> str:
+        if match.lastgroup == 'identifier':
+            return replacements.get(match.group(), match.group())
+        return match.group()
+
+    return _token_re.sub(replace, query)
+
+
 def prepare_query(query: str) -> str:
     if '%exec' in query:
         query = query.replace('LET', '\nLET')
@@ -74,22 +135,35 @@ def build_when_clause(start_date: t.Union[str, date]) -> str:
     return ''
 
 
+def _column_starts(
+    metadata: t.Union[pd.DataFrame, t.Mapping[str, limutils.RelationInfo]], symbol: str,
+) -> t.Dict[str, pd.Timestamp]:
+    if isinstance(metadata, pd.DataFrame):
+        return metadata[symbol]['daterange']['start'].to_dict()
+    info = metadata.get(symbol)
+    return {name: x.start for name, x in (info.columns or {}).items()} if info is not None else {}
+
+
 def build_series_query(
     symbols: t.Tuple[str, ...],
-    metadata: t.Optional[pd.DataFrame] = None,
+    metadata: t.Optional[t.Union[pd.DataFrame, t.Mapping[str, limutils.RelationInfo]]] = None,
     start_date: t.Optional[t.Tuple[str, date]] = None,
 ) -> str:
+    """
+    :param metadata: Date ranges of the PRA symbols, either as returned by `lim.relations` or by
+                     `lim.relation_info`, with `date_range=True`.
+    """
     symbol_query_parts = ['Show']
     for symbol in symbols:
         qx = f'{symbol}: {symbol}'
         if limutils.check_pra_symbol(symbol):
             use_high_low = False
             if metadata is not None:
-                meta = metadata[symbol]['daterange']
-                if 'Low' in meta.index and 'High' in meta.index:
-                    if 'Close' in meta.index and meta.start.Low < meta.start.Close:
+                starts = _column_starts(metadata, symbol)
+                if 'Low' in starts and 'High' in starts:
+                    if 'Close' in starts and starts['Low'] < starts['Close']:
                         use_high_low = True
-                    if 'MidPoint' in meta.index and meta.start.Low <= meta.start.MidPoint:
+                    if 'MidPoint' in starts and starts['Low'] <= starts['MidPoint']:
                         use_high_low = True
             if use_high_low:
                 qx = f'{symbol}: (High of {symbol} + Low of {symbol})/2'
@@ -160,6 +234,37 @@ def build_curve_history_query(
     return str(builder)
 
 
+def build_curve_formula_history_query(
+    formula: str, symbols: t.Dict[str, str], curve_dates: t.Tuple[date, ...], column: str = 'Close'
+) -> str:
+    """
+    Build query for a formula and multiple curve dates.
+
+    When the formula only uses FUTURES symbols it is evaluated by LIM, with one column per curve date.
+    When it mixes in NORMAL symbols (which LIM can't combine with forward curves) the components are
+    returned instead, as SYMBOL_n columns for the n-th curve date and SYMBOL columns for NORMAL symbols.
+    """
+    builder = LimQueryBuilder()
+    clause = extract_clause(formula).strip()
+    futures = [x for x in symbols if symbols[x] == 'FUTURES']
+    normal = [x for x in symbols if symbols[x] != 'FUTURES']
+
+    for symbol in normal:
+        builder.add_let(f'ATTR @{symbol} = if {symbol} is defined then {symbol} else {symbol} on previous {{{symbol} is defined}} ENDIF')
+        builder.add_show(f'{symbol}: @{symbol}')
+    for counter, curve_date in enumerate(curve_dates, start=1):
+        for symbol in futures:
+            builder.add_let(f'ATTR @{symbol}_{counter} = forward_curve({symbol},"{column}","{curve_date:{LIM_DATETIME_FORMAT}}","","","days","",0 day ago)')
+            builder.add_when(f'@{symbol}_{counter} is DEFINED')
+            if normal:
+                builder.add_show(f'{symbol}_{counter}: @{symbol}_{counter}')
+        if not normal:
+            expression = substitute_symbols(clause, {x: f'@{x}_{counter}' for x in futures})
+            builder.add_show(f'{curve_date:%Y/%m/%d}: {expression}')
+    builder.whens_to_or()
+    return str(builder)
+
+
 def build_continuous_futures_rollover_query(
     symbols: t.Union[str, tuple],
     months: t.Tuple[str, ...] = ('M1',),
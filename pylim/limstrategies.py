@@ -7,9 +7,121 @@ from pylim import lim
 from pylim import limutils
 from pylim import limqueryutils as lqu
 
+cmap = {1: ['F', 'G', 'H'], 2: ['J', 'K', 'M'], 3: ['N', 'Q', 'U'], 4: ['V', 'X', 'Z']}
+
+
+def _is_month_number(x) -> bool:
+    return isinstance(x, int) or (isinstance(x, str) and x.isnumeric())
+
+
+class ContractPanel:
+    """
+    Contracts of a symbol or formula, downloaded once and kept with one datetime column per contract month,
+    from which the quarterly, calendar, spread and fly views are computed in memory.
+
+    Example:
+    .. code-block:: python
+        >>> panel = ContractPanel('FB', start_year=2015, end_year=2022)
+        >>> q = panel.quarterly()
+        >>> s = panel.multi_spread([[6, 12], [12, 12]])
+    """
+
+    def __init__(self, symbol: str, start_year: t.Optional[int] = None, end_year: t.Optional[int] = None,
+                 months: t.Optional[t.Tuple[str, ...]] = None, start_date: t.Optional[datetime.date] = None,
+                 **kwargs):
+        """
+        :param symbol: Symbol or formula.
+        :param start_year:
+        :param end_year:
+        :param months: Restrict the download to these months, see `limutils.determine_month`.
+        :param start_date:
+        :param kwargs: Passed on to `lim.contracts`, eg chunk_size.
+        """
+        self.symbol = symbol
+        self.start_year = start_year
+        self.end_year = end_year
+        self.months = months
+        self.start_date = start_date
+        self.kwargs = kwargs
+        self._contracts: t.Optional[pd.DataFrame] = None
+
+    @property
+    def contracts(self) -> pd.DataFrame:
+        """
+        Contract values with sorted datetime columns (eg 2020-01-01 for 2020F), downloaded on first use.
+        """
+        if self._contracts is None:
+            df = lim.contracts(self.symbol, start_year=self.start_year, end_year=self.end_year, months=self.months,
+                               start_date=self.start_date, **self.kwargs)
+            self._contracts = limutils.convert_lim_contracts_to_datetime(df.astype('float64'))
+        return self._contracts
+
+    def select(self, months: t.Optional[t.Tuple[str, ...]] = None) -> pd.DataFrame:
+        """
+        Contracts of the given months only, see `limutils.determine_month`. Calendar strips also restrict the years.
+        """
+        df = self.contracts
+        if months is None:
+            return df
+        months = [x for x in months if x is not None]
+        codes = set(limutils.month_codes_for(months))
+        numbers = {m for m, code in forwards.futures_month_conv.items() if code in codes}
+        years = {int(x) for x in limutils.determine_year(months) if x.isdigit()}
+        return df[[x for x in df.columns if x.month in numbers and (not years or x.year in years)]]
+
+    def calendar(self, months: t.Optional[t.Tuple[str, ...]] = None) -> pd.DataFrame:
+        """
+        Yearly average of the contracts, restricted to `months` when given.
+        """
+        return limutils.pivots_contract_by_year(self.select(months))
+
+    def quarterly(self, quarter: int = 0) -> pd.DataFrame:
+        """
+        Yearly series of the quarter average, or of all four quarters (columns eg Q1_2020) when quarter is 0.
+        """
+        if quarter != 0:
+            return self.calendar(months=cmap[quarter])
+        return limutils.pivots_contract_by_quarter(self.contracts)
+
+    def spread(self, x: t.Union[int, str], y: t.Union[int, str], z: t.Optional[t.Union[int, str]] = None) -> pd.DataFrame:
+        """
+        Monthly spread or fly (eg 6, 12), quarterly spread (eg 'Q1', 'Q2') or calendar spread (eg 'CAL20', 'CAL21').
+        """
+        contracts = self.contracts
+
+        if z is not None:
+            if _is_month_number(x) and _is_month_number(y) and _is_month_number(z):
+                return forwards.fly(contracts, int(x), int(y), int(z))
+
+        if _is_month_number(x) and _is_month_number(y):
+            return forwards.time_spreads_monthly(contracts, x, y)
+
+        if isinstance(x, str) and isinstance(y, str):
+            x, y = x.upper(), y.upper()
+            if x.startswith('Q') and y.startswith('Q'):
+                return forwards.time_spreads_quarterly(contracts, x, y)
+
+            if x.startswith('CAL') and y.startswith('CAL'):
+                return forwards.cal_spreads(forwards.cal_contracts(self.select((x, y))))
+
+    def fly(self, x: t.Union[int, str], y: t.Union[int, str], z: t.Union[int, str]) -> pd.DataFrame:
+        return self.spread(x, y, z)
+
+    def multi_spread(self, spreads: t.Iterable[t.Tuple[int, int]]) -> pd.DataFrame:
+        """
+        Monthly spreads side by side, columns named eg JunDec_2020.
+        """
+        dfs = []
+        for spread in spreads:
+            r = forwards.time_spreads_monthly(self.contracts, spread[0], spread[1])
+            r = r.rename(
+                columns={x: '%s%s_%s' % (cal.month_abbr[spread[0]], cal.month_abbr[spread[1]], x) for x in r.columns})
+            dfs.append(r)
+        return pd.concat(dfs, axis=1)
+
 
 def quarterly(symbol: str, quarter: int = 1, start_year=datetime.date.today().year,
-              end_year=datetime.date.today().year + 2, start_date=t.Optional[datetime.date]):
+              end_year=datetime.date.today().year + 2, start_date: t.Optional[datetime.date] = None):
     """
     Given a symbol or formula, calculate the quarterly average and return as a series of yearly timeseries
     :param symbol:
@@ -18,20 +130,9 @@ def quarterly(symbol: str, quarter: int = 1, start_year=datetime.date.today().ye
     :param end_year:
     :return:
     """
-    cmap = {1: ['F', 'G', 'H'], 2: ['J', 'K', 'M'], 3: ['N', 'Q', 'U'], 4: ['V', 'X', 'Z']}
-
-    if quarter == 0:  # calc Q1,Q2,Q3,Q4
-        df = lim.contracts(symbol, start_year=start_year, end_year=end_year, start_date=start_date)
-        dfs = []
-        for qtr in cmap:  # filter columns for each quarter
-            d = df[[x for x in df.columns if x[-1] in cmap[qtr]]]
-            d = limutils.convert_lim_contracts_to_datetime(d)
-            d = limutils.pivots_contract_by_year(d)
-            d = d.rename(columns={x: 'Q%s_%s' % (qtr, x) for x in d.columns})  # eg Q12020
-            dfs.append(d)
-        return pd.concat(dfs, 1)
-    else:
-        return calendar(symbol, start_year=start_year, end_year=end_year, months=cmap[quarter], start_date=start_date)
+    months = cmap[quarter] if quarter != 0 else None
+    panel = ContractPanel(symbol, start_year=start_year, end_year=end_year, months=months, start_date=start_date)
+    return panel.quarterly(quarter)
 
 
 def calendar(symbol, start_year=datetime.date.today().year, end_year=datetime.date.today().year + 2,
@@ -46,32 +147,15 @@ def calendar(symbol, start_year=datetime.date.today().year, end_year=datetime.da
     :param end_year:
     :return:
     """
-    df = lim.contracts(symbol, start_year=start_year, end_year=end_year, months=months, start_date=start_date)
-    df = limutils.convert_lim_contracts_to_datetime(df)
-    return limutils.pivots_contract_by_year(df)
+    panel = ContractPanel(symbol, start_year=start_year, end_year=end_year, months=months, start_date=start_date)
+    return panel.calendar()
 
 
 def spread(symbol: str, x: t.Tuple[int, str], y: t.Tuple[int, str], z: t.Optional[t.Tuple[int, str]] = None,
            start_year: datetime.date.today().year = None, end_year: datetime.date.today().year = None,
            start_date: t.Optional[datetime.date] = None) -> pd.DataFrame:
-    contracts = lim.contracts(symbol, start_year=start_year, end_year=end_year, months=[x, y, z],
-                                 start_date=start_date)
-    contracts = limutils.convert_lim_contracts_to_datetime(contracts)
-
-    if z is not None:
-        if (isinstance(x, int) or x.isnumeric()) and (isinstance(y, int) or y.isnumeric()) and (isinstance(z, int) or z.isnumeric()):
-            return forwards.fly(contracts, int(x), int(y), int(z))
-
-    if (isinstance(x, int) or x.isnumeric()) and (isinstance(y, int) or y.isnumeric()):
-        return forwards.time_spreads_monthly(contracts, x, y)
-
-    if isinstance(x, str) and isinstance(y, str):
-        x, y = x.upper(), y.upper()
-        if x.startswith('Q') and y.startswith('Q'):
-            return forwards.time_spreads_quarterly(contracts, x, y)
-
-        if x.startswith('CAL') and y.startswith('CAL'):
-            return forwards.cal_spreads(forwards.cal_contracts(contracts))
+    panel = ContractPanel(symbol, start_year=start_year, end_year=end_year, months=[x, y, z], start_date=start_date)
+    return panel.spread(x, y, z)
 
 
 def fly(symbol: str, x: t.Tuple[int, str], y: t.Tuple[int, str], z: t.Optional[t.Tuple[int, str]],
@@ -83,16 +167,5 @@ def fly(symbol: str, x: t.Tuple[int, str], y: t.Tuple[int, str], z: t.Optional[t
 def multi_spread(symbol, spreads, start_year: datetime.date.today().year = None,
                  end_year: datetime.date.today().year = None,
                  start_date: t.Optional[datetime.date] = None) -> pd.DataFrame:
-    contracts = lim.contracts(symbol, start_year=start_year, end_year=end_year, start_date=start_date)
-    contracts = limutils.convert_lim_contracts_to_datetime(contracts)
-
-    dfs = []
-    for spread in spreads:
-        r = forwards.time_spreads_monthly(contracts, spread[0], spread[1])
-        r = r.rename(
-            columns={x: '%s%s_%s' % (cal.month_abbr[spread[0]], cal.month_abbr[spread[1]], x) for x in r.columns})
-        dfs.append(r)
-
-    res = pd.concat(dfs, 1)
-    return res
-
+    panel = ContractPanel(symbol, start_year=start_year, end_year=end_year, start_date=start_date)
+    return panel.multi_spread(spreads)
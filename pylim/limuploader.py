@@ -1,18 +1,28 @@
+import io
 import logging
-import time
-from datetime import datetime
+import typing as t
+from xml.sax.saxutils import escape
 
-import lxml.builder
+import numpy as np
 import pandas as pd
 import requests
 from lxml import etree
 
-from pylim.core import get_lim_session
+from pylim.core import get_shared_session, run_many
+from pylim.core.polling import PollingStrategy
 
-sleep_time = 0.5
-calltries = 50
+# Polling of upload jobs, until done or the deadline.
+polling = PollingStrategy(initial_delay=0.5, max_delay=5.0, deadline=300.0)
 upload_headers = {'Content-Type': 'text/xml'}
 default_column = 'TopColumn:Price:Close'
+upload_done_codes = {'200', '201', '300', '302'}
+excel_epoch = pd.Timestamp('1899-12-30')
+# Number of cells formatted and encoded per write.
+write_batch_size = 10000
+upload_row_template = (
+    '<Row num="{}"><Cols><Col num="1">{}</Col><Col num="2">{}</Col><Col num="3">{}</Col>'
+    '<Col num="4">{}</Col><Col num="5">{}</Col></Cols></Row>'
+)
 
 
 def check_upload_status(session: requests.Session, job_id: int):
@@ -27,55 +37,61 @@ def check_upload_status(session: requests.Session, job_id: int):
         message_el = status_el.find('message')
         if message_el is not None:
             msg = message_el.text
-        if code not in {'200', '201', '300', '302'}:
+        if code not in upload_done_codes:
             logging.warning(f'job id {job_id}: code:{code} msg: {msg}')
     return code, msg
 
 
-def build_upload_xml(df, dfmeta):
+def excel_serial_dates(index: pd.Index) -> np.ndarray:
     """
-    Converts a dataframe (column headings being the treepath) into an XML that the uploader takes.
+    Excel serial day numbers (days since 1899-12-30) of the dates in `index`, times of day are dropped.
     """
-    E = lxml.builder.ElementMaker()
-    ROOT = E.ExcelData
-    ROWS = E.Rows
-    xROW = E.Row
-    xCOL = E.Col
-    xCOLS = E.Cols
-
-    entries = []
-    count = 1
-    for irow, row in df.iterrows():
-        for col, val in row.iteritems():
-            if pd.isna(val):
-                continue
-            tokens = col.split(';')
-            treepath = tokens[0]
-            column = default_column if len(tokens) == 1 else tokens[1]
-            desc = dfmeta.get('description', '')
-            if isinstance(irow, pd.Timestamp):
-                irow = irow.date()
-            erow = xROW(
-                xCOLS(
-                    xCOL(treepath, num="1"),
-                    xCOL(column, num="2"),
-                    xCOL(str((irow - datetime(1899, 12, 30).date()).days), num="3"), # excel dateformat
-                    xCOL(str(val), num="4"),
-                    xCOL(desc, num="5"),
-                ),
-                num=str(count)
+    dates = pd.DatetimeIndex(pd.to_datetime(index))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    return ((dates.normalize() - excel_epoch) // pd.Timedelta(days=1)).to_numpy()
+
+
+def write_upload_xml(df, dfmeta, out: t.BinaryIO) -> None:
+    """
+    Write the upload XML of a dataframe (column headings being the treepath) to a binary file object.
+
+    Cells are written row by row, in date then column order, skipping NaNs, without building an element tree.
+    Values are written as `str` of their row-wise common type, like `DataFrame.iterrows` gives them: a frame
+    of integer columns only writes 1, a frame with any float column writes 1.0.
+    """
+    desc = escape(dfmeta.get('description', ''))
+    treepaths, columns = [], []
+    for col in df.columns:
+        tokens = col.split(';')
+        treepaths.append(escape(tokens[0]))
+        columns.append(escape(default_column if len(tokens) == 1 else tokens[1]))
+
+    values = df.to_numpy()
+    irows, icols = np.nonzero(~pd.isna(values))
+    days = excel_serial_dates(df.index)[irows].tolist()
+    cells = values[irows, icols].tolist()
+
+    out.write(b'<ExcelData><Rows>')
+    for start in range(0, len(cells), write_batch_size):
+        stop = start + write_batch_size
+        rows = ''.join(
+            upload_row_template.format(num, treepaths[icol], columns[icol], day, val, desc)
+            for num, icol, day, val in zip(
+                range(start + 1, stop + 1), icols[start:stop].tolist(), days[start:stop], cells[start:stop],
             )
-            count = count + 1
-            entries.append(erow)
+        )
+        out.write(rows.encode('ascii', 'xmlcharrefreplace'))
+    out.write(b'</Rows></ExcelData>')
 
-    irow = ROOT()
-    xROWS = ROWS()
-    for x in entries:
-        xROWS.append(x)
-    irow.append(xROWS)
 
-    res = lxml.etree.tostring(irow, pretty_print=True)
-    return res
+def build_upload_xml(df, dfmeta) -> bytes:
+    """
+    Converts a dataframe (column headings being the treepath) into an XML that the uploader takes.
+    """
+    buffer = io.BytesIO()
+    write_upload_xml(df, dfmeta, buffer)
+    return buffer.getvalue()
 
 
 def chunks(lst, n):
@@ -84,13 +100,48 @@ def chunks(lst, n):
         yield lst[i:i + n]
 
 
-def upload_chunk(session, df, dfmeta, chunk_id: int):
+def chunks_by_cells(df: pd.DataFrame, max_cells: int, max_rows: t.Optional[int] = None) -> t.Iterator[pd.DataFrame]:
     """
-    Upload dataframe to MorningStar.
+    Yield successive row chunks of `df` holding at most `max_cells` non-null values and `max_rows` rows.
+
+    A row with more than `max_cells` values gets a chunk of its own.
+    """
+    counts = df.notna().sum(axis=1).to_numpy()
+    start, cells = 0, 0
+    for i, count in enumerate(counts):
+        if i > start and (cells + count > max_cells or (max_rows is not None and i - start >= max_rows)):
+            yield df.iloc[start:i]
+            start, cells = i, 0
+        cells += count
+    if start < len(df):
+        yield df.iloc[start:]
+
+
+class UploadResult(t.NamedTuple):
+    """
+    Outcome of the upload of one chunk. `error` holds the exception of a chunk whose upload failed,
+    `code` is then None when it failed before the server answered.
+    """
+    chunk_id: int
+    job_id: t.Optional[str]
+    code: t.Optional[str]
+    msg: t.Optional[str]
+    cells: int
+    error: t.Optional[Exception] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None and self.code in upload_done_codes
+
+
+def submit_chunk(session, df, dfmeta, chunk_id: int) -> t.Tuple[str, t.Optional[str]]:
+    """
+    Post a dataframe to the MorningStar uploader without waiting for the upload job.
 
     :param session: Requests HTTP session to reuse.
     :param df: DataFrame to upload.
     :param dfmeta: DataFrame's metadata.
+    :return: The upload status and the job id, None when no job was started.
     """
     params = {
         'username': session.auth[0],
@@ -106,20 +157,79 @@ def upload_chunk(session, df, dfmeta, chunk_id: int):
         raise
     root = etree.fromstring(response.content)
     intStatus = root.attrib['intStatus']
-    if intStatus == '202':
-        job_id = root.attrib['jobID']
-        logging.debug(f'Submitted job id: {job_id}')
-        for i in range(0, calltries):
-            code, msg = check_upload_status(session, job_id)
-            if code in {'200', '201', '300', '302'}:
-                return msg
-            time.sleep(sleep_time)
+    if intStatus != '202':
+        logging.warning(f'Chunk #{chunk_id} not accepted: status {intStatus}')
+        return intStatus, None
+    job_id = root.attrib['jobID']
+    logging.debug(f'Submitted job id: {job_id}')
+    return intStatus, job_id
+
+
+def wait_for_upload(session, job_id: str) -> t.Tuple[str, t.Optional[str]]:
+    """
+    Poll an upload job until it is done or the polling deadline passes.
+
+    :return: The last status code and the job message, None when the job didn't finish.
+    """
+    expires_at = polling.expires_at()
+    attempt = 0
+    while True:
+        code, msg = check_upload_status(session, job_id)
+        if code in upload_done_codes:
+            return code, msg
+        if not polling.wait(attempt, expires_at):
+            return code, None
+        attempt += 1
+
+
+def upload_chunk(session, df, dfmeta, chunk_id: int):
+    """
+    Upload dataframe to MorningStar.
 
+    :param session: Requests HTTP session to reuse.
+    :param df: DataFrame to upload.
+    :param dfmeta: DataFrame's metadata.
+    """
+    _, job_id = submit_chunk(session, df, dfmeta, chunk_id)
+    if job_id is not None:
+        return wait_for_upload(session, job_id)[1]
+
+
+def upload_series(
+        df,
+        dfmeta,
+        max_chunk_size: t.Optional[int] = None,
+        max_chunk_cells: int = 50000,
+        max_workers: int = 4,
+) -> t.List[UploadResult]:
+    """
+    Upload a dataframe in chunks, with up to `max_workers` upload jobs submitted and polled concurrently.
 
-def upload_series(df, dfmeta, max_chunk_size: int = 1000):
+    :param df: DataFrame to upload, column headings being the treepath.
+    :param dfmeta: DataFrame's metadata.
+    :param max_chunk_size: Maximum number of rows per chunk, unlimited when None.
+    :param max_chunk_cells: Maximum number of non-null values per chunk.
+    :param max_workers: Maximum number of upload jobs in flight.
+    :return: Result of each chunk's upload job, in chunk order. A chunk whose upload raised has its
+             exception in `error`, the other chunks are uploaded regardless.
+    """
     if not len(df.columns):
-        return
-    chunk_size = int(round(len(df) / max_chunk_size, 0)) or 1
-    with get_lim_session() as session:
-        for i, chunk in enumerate(chunks(df, chunk_size), start=1):
-            upload_chunk(session, chunk, dfmeta, i)
+        return []
+    session = get_shared_session()
+    parts = list(enumerate(chunks_by_cells(df, max_chunk_cells, max_rows=max_chunk_size), start=1))
+
+    def upload(part: t.Tuple[int, pd.DataFrame]) -> UploadResult:
+        chunk_id, chunk = part
+        cells = int(chunk.count().sum())
+        code, job_id = None, None
+        try:
+            code, job_id = submit_chunk(session, chunk, dfmeta, chunk_id)
+            msg = None
+            if job_id is not None:
+                code, msg = wait_for_upload(session, job_id)
+        except Exception as e:
+            logging.error(f'Upload of chunk #{chunk_id} failed: {e}')
+            return UploadResult(chunk_id, job_id, code, str(e), cells, error=e)
+        return UploadResult(chunk_id, job_id, code, msg, cells)
+
+    return run_many(upload, parts, max_workers=max_workers)
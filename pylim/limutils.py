@@ -1,8 +1,17 @@
+import array
+import functools
 import typing as t
+from datetime import datetime
 from typing import Sequence
 
+import numpy as np
 import pandas as pd
 from commodutil import forwards
+from lxml import etree
+
+# Formats tried, in order, for the RowDates of a datarequests response before falling back to inference.
+row_date_formats = ('%Y-%m-%dT%H:%M:%S', '%Y-%m-%d', '%m/%d/%Y')
+_month_codes = frozenset(forwards.futures_month_conv.values())
 
 
 def alternate_col_val(values, noCols):
@@ -10,19 +19,80 @@ def alternate_col_val(values, noCols):
         yield values[x:x + noCols]
 
 
-def build_dataframe(reports) -> pd.DataFrame:
-    columns = [x.text for x in reports.iter(tag='ColumnHeadings')]
-    dates = [x.text for x in reports.iter(tag='RowDates')]
+def parse_row_dates(dates: t.List[str]) -> pd.DatetimeIndex:
+    """
+    Convert RowDates strings to a DatetimeIndex, using an explicit format detected on the first date.
+    """
+    for fmt in row_date_formats:
+        try:
+            datetime.strptime(dates[0], fmt)
+            return pd.DatetimeIndex(pd.to_datetime(dates, format=fmt))
+        except ValueError:
+            continue
+    return pd.DatetimeIndex(pd.to_datetime(dates))
+
+
+def build_dataframe(reports, dtype: t.Union[str, np.dtype] = np.float64) -> pd.DataFrame:
+    """
+    Build a DataFrame from the Reports element of a datarequests response.
+
+    Values are converted straight into a NumPy array and reshaped to (dates, columns) without
+    intermediate row lists, and dates are parsed with an explicit format.
+
+    :param reports: Reports element of the response.
+    :param dtype: Float type of the values, float32 halves the memory of the result.
+    """
+    columns = [x.text for x in reports.iter('ColumnHeadings')]
+    dates = [x.text for x in reports.iter('RowDates')]
     if len(columns) == 0 or len(dates) == 0:
         return
 
-    values = [float(x.text) for x in reports.iter(tag='Values')]
-    values = list(alternate_col_val(values, len(columns)))
+    values = [x.text for x in reports.iter('Values')]
+    array = np.fromiter(map(float, values), dtype=dtype, count=len(values))
+    array = array.reshape(len(dates), len(columns))
 
-    df = pd.DataFrame(values, columns=columns, index=pd.to_datetime(dates))
+    df = pd.DataFrame(array, columns=columns, index=parse_row_dates(dates), copy=False)
     return df
 
 
+def iterparse_response(source: t.BinaryIO, dtype: t.Union[str, np.dtype] = np.float64) -> t.Tuple[dict, t.Optional[pd.DataFrame]]:
+    """
+    Stream-parse a datarequests response from a file-like object.
+
+    Values are appended to a compact typed buffer as they are read and each element is dropped from
+    the tree once consumed, so peak memory stays close to the size of the resulting DataFrame, which
+    wraps the buffer without a copy.
+
+    :param source: Binary file-like object with the response body, e.g. `response.raw`.
+    :param dtype: Float type of the values.
+    :return: Attributes of the response root element and the result DataFrame, which is None when
+             the response holds no data (e.g. the job is still running).
+    """
+    dtype = np.dtype(dtype)
+    columns, dates = [], []
+    values = array.array(dtype.char)
+    context = etree.iterparse(source, events=('end',), tag=('ColumnHeadings', 'RowDates', 'Values'))
+    for _, element in context:
+        tag = element.tag
+        if tag == 'Values':
+            values.append(float(element.text))
+        elif tag == 'RowDates':
+            dates.append(element.text)
+        else:
+            columns.append(element.text)
+        element.clear()
+        parent = element.getparent()
+        while element.getprevious() is not None:
+            del parent[0]
+    attrib = dict(context.root.attrib)
+    if len(columns) == 0 or len(dates) == 0:
+        return attrib, None
+
+    data = np.frombuffer(values, dtype=dtype).reshape(len(dates), len(columns))
+    df = pd.DataFrame(data, columns=columns, index=parse_row_dates(dates), copy=False)
+    return attrib, df
+
+
 def check_pra_symbol(symbol):
     """
     Check if this is a Platts or Argus symbol.
@@ -42,45 +112,140 @@ def check_pra_symbol(symbol):
     return False
 
 
-def relinfo_children(df, root):
+class ColumnRange(t.NamedTuple):
     """
-    Convert the children from relinfo into a dataframe and attached to main result.
+    Dates of the first and last values of a relation column.
     """
-    dfs = []
+    start: pd.Timestamp
+    end: pd.Timestamp
 
-    for col in df.columns:
-        if df[col].hasChildren == '1':
-            namec = pd.Series([x.attrib['name'] for x in root[col][0]], dtype='object')
-            namec.name = 'name'
-            typec = pd.Series([x.attrib['type'] for x in root[col][0]], dtype='object')
-            typec.name = 'type'
-            d = pd.concat([namec, typec], axis=1)
-            dfs.append(d)
 
-    df = df.append(pd.Series(dfs, name='children'))
-    return df
+class RelationInfo(t.NamedTuple):
+    """
+    Schema metadata of one relation, a lighter alternative to a column of the `lim.relations` DataFrame.
+
+    :ivar attrib: Attributes of the RelationInfo node, eg name, type, hasChildren and description.
+    :ivar children: (name, type) of the child relations, None when not requested or without children.
+    :ivar columns: Date range of each column, by column name. None when not requested.
+    """
+    name: str
+    type: t.Optional[str]
+    attrib: t.Dict[str, str]
+    children: t.Optional[t.List[t.Tuple[str, str]]] = None
+    columns: t.Optional[t.Dict[str, ColumnRange]] = None
 
+    @property
+    def has_children(self) -> bool:
+        return self.attrib.get('hasChildren') == '1'
 
-def relinfo_daterange(df, root):
+
+def parse_relations(root, show_children: bool = False, date_range: bool = False) -> t.List[RelationInfo]:
     """
-    Convert the date ranges from relinfo into a dataframe and attached to main result.
+    Read the RelationInfo nodes of a relations response in one pass.
+    All column dates are converted together once the nodes are read.
+    """
+    nodes, dates = [], []
+    for node in root:
+        attrib = dict(node.attrib)
+        children = None
+        if show_children and attrib.get('hasChildren') == '1':
+            element = node.find('Children')
+            if element is not None:
+                children = [(x.get('name'), x.get('type')) for x in element]
+        columns = None
+        if date_range:
+            columns = []
+            for column in node.iterfind('Columns/Column'):
+                columns.append(column.get('cName'))
+                # Start and end date elements, in this order.
+                texts = [x.text for x in column[:2]]
+                texts += [None] * (2 - len(texts))
+                dates += [x[:10] if x else None for x in texts]
+        nodes.append((attrib, children, columns))
+
+    dates = pd.to_datetime(dates, format='%Y-%m-%d') if dates else None
+    infos, offset = [], 0
+    for attrib, children, columns in nodes:
+        if columns is not None:
+            ranges = {}
+            for name in columns:
+                ranges[name] = ColumnRange(dates[offset], dates[offset + 1])
+                offset += 2
+            columns = ranges
+        infos.append(RelationInfo(attrib.get('name'), attrib.get('type'), attrib, children, columns))
+    return infos
+
+
+def _children_frame(info: RelationInfo) -> t.Optional[pd.DataFrame]:
+    if info.children is None:
+        return None
+    return pd.DataFrame(info.children, columns=['name', 'type'], dtype='object')
+
+
+def _daterange_frame(info: RelationInfo) -> pd.DataFrame:
+    columns = info.columns or {}
+    return pd.DataFrame(
+        {
+            'start': pd.DatetimeIndex([x.start for x in columns.values()]),
+            'end': pd.DatetimeIndex([x.end for x in columns.values()]),
+        },
+        index=list(columns),
+    )
+
+
+def relations_frame(infos: t.List[RelationInfo], show_children: bool = False, date_range: bool = False) -> pd.DataFrame:
     """
-    dfs = []
+    Relations metadata as returned by `lim.relations`: one column per relation and one row per attribute,
+    plus 'children' and 'daterange' rows of DataFrames when requested. The frame is built once.
 
-    for symbol in df.columns:
-        cols = root[symbol].find('Columns')
-        colnames = [x.attrib['cName'] for x in cols.getchildren()]
-        s = []
-        for col in cols:
-            start = pd.to_datetime(col.getchildren()[0].text[:10])
-            end = pd.to_datetime(col.getchildren()[1].text[:10])
-            s.append([start, end])
+    :raises ValueError: When there is no relation.
+    """
+    if not infos:
+        raise ValueError('No relations found')
+    index = list(dict.fromkeys(key for info in infos for key in info.attrib))
+    positions = {key: i for i, key in enumerate(index)}
+    rows = []
+    if show_children:
+        rows.append(('children', _children_frame))
+    if date_range:
+        rows.append(('daterange', _daterange_frame))
+
+    values = np.full((len(index) + len(rows), len(infos)), np.nan, dtype=object)
+    for j, info in enumerate(infos):
+        for key, value in info.attrib.items():
+            values[positions[key], j] = value
+        for i, (_, build) in enumerate(rows, len(index)):
+            frame = build(info)
+            if frame is not None:
+                values[i, j] = frame
+
+    columns = pd.Index([info.name for info in infos], dtype='object', name='name')
+    return pd.DataFrame(values, index=index + [name for name, _ in rows], columns=columns)
+
+
+def _append_row(df: pd.DataFrame, name: str, values: t.List[t.Any]) -> pd.DataFrame:
+    row = np.full((1, len(values)), np.nan, dtype=object)
+    for i, value in enumerate(values):
+        if value is not None:
+            row[0, i] = value
+    return pd.concat([df, pd.DataFrame(row, index=[name], columns=df.columns)])
 
-        dr = pd.DataFrame(s, index=colnames, columns=['start', 'end'])
-        dfs.append(dr)
 
-    df = df.append(pd.Series(dfs, name='daterange'))
-    return df
+def relinfo_children(df, root):
+    """
+    Convert the children from relinfo into a dataframe and attached to main result.
+    Relations without children get NaN.
+    """
+    infos = parse_relations(root, show_children=True)
+    return _append_row(df, 'children', [_children_frame(x) for x in infos])
+
+
+def relinfo_daterange(df, root):
+    """
+    Convert the date ranges from relinfo into a dataframe and attached to main result.
+    """
+    infos = parse_relations(root, date_range=True)
+    return _append_row(df, 'daterange', [_daterange_frame(x) for x in infos])
 
 
 def determine_month(sample):
@@ -116,62 +281,180 @@ def determine_year(samples):
     return res
 
 
-def filter_contracts_months(contracts: t.Tuple[str, ...], months: t.Tuple[str, ...]):
-    months_org = months
+def month_codes_for(months: t.Iterable[t.Union[str, int]]) -> t.List[str]:
+    """
+    Month codes selected by month specs such as 1, 'F', 'Q1' or 'CAL20'.
+    """
+    codes = []
+    for month in months:
+        code = determine_month(month)
+        if code is not None:
+            codes.extend(code)
+    return codes
 
-    months = [determine_month(x) for x in months]
-    if None in months:
-        months.remove(None)
-    months = [item for sublist in months for item in sublist]  # flatten list
 
-    contracts = [x for x in contracts if x[-1] in months]
+class ContractIndex:
+    """
+    Contract names (eg FB_2020G) parsed once into root, year and month code arrays, for vectorized filtering.
+
+    Names without a 4 digit year after the last '_' have year -1, and those not ending in a month code have
+    an empty month code.
+
+    Example:
+    .. code-block:: python
+        >>> index = ContractIndex(['FB_2020F', 'FB_2021G', 'FP_2020F'])
+        >>> index.filter(start_year=2020, end_year=2020).tolist()
+        ['FB_2020F', 'FP_2020F']
+        >>> index.common_codes(('FB', 'FP'))
+        ['2020F']
+    """
 
-    # year limiter for cal
-    year_filter = determine_year(months_org)
-    if year_filter is not None and len(year_filter) > 0:
-        contracts = [x for x in contracts if [y for y in year_filter if y in x]]
+    def __init__(self, contracts: t.Iterable[str]):
+        self.contracts = np.array(list(contracts), dtype=object)
+        parts = [x.rpartition('_') for x in self.contracts]
+        self.roots = np.array([x[0] for x in parts], dtype=object)
+        self.codes = np.array([x[2] for x in parts], dtype=object)
+        self.years = np.array([int(x[:4]) if x[:4].isdigit() else -1 for x in self.codes], dtype=np.int64)
+        self.months = np.array(
+            [x[-1] if x and x[-1] in _month_codes else '' for x in self.codes], dtype=object
+        )
+        self._by_root: t.Optional[t.Dict[str, np.ndarray]] = None
+
+    def __len__(self) -> int:
+        return len(self.contracts)
+
+    def __iter__(self) -> t.Iterator[str]:
+        return iter(self.contracts)
+
+    def tolist(self) -> t.List[str]:
+        return self.contracts.tolist()
+
+    def take(self, selector: np.ndarray) -> 'ContractIndex':
+        """
+        Subset of the index by boolean mask or positions, without parsing the names again.
+        """
+        index = ContractIndex.__new__(ContractIndex)
+        index.contracts = self.contracts[selector]
+        index.roots = self.roots[selector]
+        index.codes = self.codes[selector]
+        index.years = self.years[selector]
+        index.months = self.months[selector]
+        index._by_root = None
+        return index
+
+    def mask(
+            self,
+            start_year: t.Optional[int] = None,
+            end_year: t.Optional[int] = None,
+            months: t.Optional[t.Iterable[t.Union[str, int]]] = None,
+    ) -> np.ndarray:
+        """
+        Boolean mask of the contracts within the year range and months.
+
+        :param months: Month specs as accepted by `determine_month`: month numbers, month codes, quarters
+                       ('Q1'..'Q4') or calendar strips ('CAL20', 'CAL2020') which also restrict the year.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if start_year is not None:
+            mask &= (self.years >= 0) & (self.years >= start_year)
+        if end_year is not None:
+            mask &= (self.years >= 0) & (self.years <= end_year)
+        if months is not None:
+            months = list(months)
+            mask &= np.isin(self.months, month_codes_for(months))
+            cal_years = [int(x) for x in determine_year(months) if x.isdigit()]
+            if cal_years:
+                mask &= np.isin(self.years, cal_years)
+        return mask
+
+    def filter(
+            self,
+            start_year: t.Optional[int] = None,
+            end_year: t.Optional[int] = None,
+            months: t.Optional[t.Iterable[t.Union[str, int]]] = None,
+    ) -> 'ContractIndex':
+        """
+        Contracts within the year range and months, see `mask`.
+        """
+        return self.take(self.mask(start_year=start_year, end_year=end_year, months=months))
+
+    def for_root(self, root: str) -> 'ContractIndex':
+        """
+        Contracts of exactly this root symbol, so FB doesn't match FBX.
+        """
+        if self._by_root is None:
+            positions = {}
+            for i, x in enumerate(self.roots):
+                positions.setdefault(x, []).append(i)
+            self._by_root = {x: np.array(p, dtype=np.int64) for x, p in positions.items()}
+        return self.take(self._by_root.get(root, np.array([], dtype=np.int64)))
+
+    def common_codes(self, roots: t.Iterable[str]) -> t.List[str]:
+        """
+        Sorted contract codes (eg 2020F) available for every one of the roots.
+        """
+        codes = None
+        for root in roots:
+            root_codes = self.for_root(root).codes.astype(str)
+            codes = root_codes if codes is None else np.intersect1d(codes, root_codes)
+        return [] if codes is None else np.unique(codes).tolist()
 
-    return contracts
+
+def filter_contracts_months(contracts: t.Tuple[str, ...], months: t.Tuple[str, ...]):
+    return ContractIndex(contracts).filter(months=months).tolist()
 
 
 def filter_contracts(contracts: t.Tuple[str, ...], start_year: int=None, end_year: int=None, months:t.Optional[t.Tuple[str, ...]] =None):
     """
     Given list of contracts (eg FB_2020G) filter by start/end year and month.
     """
-    if start_year is not None:
-        contracts = [x for x in contracts if '_' in x and len(x.split('_')[-1]) >= 4 and x.split('_')[-1][:4].isdigit() and start_year <= int(x.split('_')[-1][:4])]
-    if end_year is not None:
-        contracts = [x for x in contracts if int(x.split('_')[-1][:4]) <= end_year]
-    if months is not None:
-        contracts = filter_contracts_months(contracts, months)
-    return contracts
+    return ContractIndex(contracts).filter(start_year=start_year, end_year=end_year, months=months).tolist()
+
+
+@functools.lru_cache(maxsize=None)
+def contract_to_date(contract: str) -> pd.Timestamp:
+    """
+    First day of the delivery month of a contract code, eg 2020F to 2020-01-01. Results are cached.
+    """
+    return pd.Timestamp(forwards.convert_contract_to_date(contract))
 
 
 def convert_lim_contracts_to_datetime(contracts):
     """
     Given a dataframe with column headings such as 2020F, 2020G, convert them to 2020-01-01, 2020-02-01.
     """
-    contracts = contracts.rename(
-        columns={x: pd.to_datetime(forwards.convert_contract_to_date(x)) for x in contracts.columns}
-    )
-    # sort values otherwise column selection in code below doesn't work
-    contracts = contracts.reindex(sorted(contracts.columns), axis=1)
+    dates = pd.DatetimeIndex([contract_to_date(x) for x in contracts.columns])
+    # sort columns otherwise column selection in code below doesn't work
+    order = dates.argsort(kind='stable')
+    contracts = contracts.iloc[:, order]
+    contracts.columns = dates[order]
     return contracts
 
 
+def _group_contracts(df: pd.DataFrame, keys: t.List[pd.Index]) -> pd.DataFrame:
+    # Average the columns sharing the keys, through a transposed groupby.
+    return df.T.groupby(keys, sort=True).mean().T
+
+
 def pivots_contract_by_year(df):
     """
     Given a list of contracts eg 2020F, 2019F, average by year.
     """
-    dfs = []
-    for year in set([x.year for x in df.columns]):
-        d = df[[x for x in df.columns if x.year == year]].mean(1)
-        d.name = year
-        dfs.append(d)
+    columns = pd.DatetimeIndex(df.columns)
+    res = _group_contracts(df, [columns.year])
+    res.columns = res.columns.astype(int)
+    return res
 
-    df = pd.concat(dfs, 1)
-    df = df.reindex(sorted(df.columns), axis=1)
-    return df
+
+def pivots_contract_by_quarter(df):
+    """
+    Given a list of contracts eg 2020F, 2019F, average by quarter and year, with columns such as Q1_2020.
+    Columns are ordered by quarter, then year.
+    """
+    columns = pd.DatetimeIndex(df.columns)
+    res = _group_contracts(df, [columns.quarter, columns.year])
+    res.columns = [f'Q{q}_{y}' for q, y in res.columns]
+    return res
 
 
 def is_sequence(obj: t.Any) -> bool:
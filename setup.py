@@ -16,6 +16,7 @@ setuptools.setup(
         "Operating System :: OS Independent",
     ],
     install_requires=["pandas", "lxml", "requests", "commodutil"],
+    extras_require={"async": ["aiohttp"], "cache": ["pyarrow"]},
     python_requires=">=3.8",
     setup_requires=["pytest-runner"],
     tests_require=["pytest"],
@@ -0,0 +1,18 @@
+import pytest
+
+from pylim import core
+from pylim import lim
+from test.fakelim import FakeLim
+
+
+@pytest.fixture
+def fakelim():
+    """
+    Local LIM stand-in that the shared session points at for the duration of a test.
+    """
+    with FakeLim() as server:
+        core.configure_shared_session(server=server.url, username='user', password='secret')
+        lim.invalidate_relations()
+        yield server
+    core.configure_shared_session()
+    lim.invalidate_relations()
@@ -0,0 +1,286 @@
+"""
+In-process stand-in for the MorningStar LIM API, to test and benchmark pylim without the live server.
+
+It serves the datarequests, schema relations and upload endpoints on localhost with realistic XML,
+deterministic values, a configurable response size and latency, and jobs that report "still running"
+for a configurable number of polls.
+
+Example:
+.. code-block:: python
+    >>> with FakeLim(rows=5000, polls=2) as server:
+    ...     session = server.session()
+    ...     df = core.query('Show FB: FB', session=session)
+"""
+import itertools
+import re
+import threading
+import time
+import typing as t
+import zlib
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import escape, quoteattr
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+from pylim.core import get_lim_session
+
+# Categories of the relation tree, with their (child, type) entries.
+default_tree = {
+    'TopRelation': [('Futures', 'CATEGORY'), ('Spot', 'CATEGORY')],
+    'Futures': [('Ipe', 'CATEGORY'), ('Nymex', 'CATEGORY')],
+    'Ipe': [('FB', 'FUTURES'), ('FP', 'FUTURES')],
+    'Nymex': [('CL', 'FUTURES'), ('HO', 'FUTURES')],
+    'Spot': [('GBPUSD', 'NORMAL'), ('PUMFE03', 'NORMAL')],
+}
+month_codes = 'FGHJKMNQUVXZ'
+
+
+class FakeLim:
+    """
+    :param rows: Number of business days in each datarequests result.
+    :param end_date: Last date of the results.
+    :param latency: Seconds every request is delayed by.
+    :param polls: Number of polls a datarequests or upload job reports as running before it completes.
+    :param tree: Relation tree, see `default_tree`. Names not found in it are unknown relations, and
+                 queries showing them as `X: X` fail.
+    :param contract_years: Years of the monthly contracts listed under each FUTURES relation.
+    """
+
+    def __init__(
+            self,
+            rows: int = 260,
+            end_date: str = '2020-12-31',
+            latency: float = 0.0,
+            polls: int = 0,
+            tree: t.Optional[t.Dict[str, t.List[t.Tuple[str, str]]]] = None,
+            contract_years: t.Iterable[int] = range(2018, 2023),
+    ):
+        self.rows = rows
+        self.end_date = pd.Timestamp(end_date)
+        self.latency = latency
+        self.polls = polls
+        self.tree = default_tree if tree is None else tree
+        self.contract_years = list(contract_years)
+        self.types = {child: type for children in self.tree.values() for child, type in children}
+        self.types.update({name: 'CATEGORY' for name in self.tree})
+        self.requests: t.List[t.Tuple[str, str]] = []
+        self.uploaded_cells = 0
+        self._jobs: t.Dict[int, t.List] = {}
+        self._job_ids = itertools.count(1000)
+        self._lock = threading.Lock()
+        self._server: t.Optional[ThreadingHTTPServer] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self) -> 'FakeLim':
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _handler(self))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> 'FakeLim':
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def session(self, **kwargs):
+        """
+        New pylim HTTP session pointing at this server, see `pylim.core.get_lim_session`.
+        """
+        return get_lim_session(server=self.url, username='user', password='secret', **kwargs)
+
+    def count(self, method: str, prefix: str) -> int:
+        """
+        Number of requests received with this method and a path starting with `prefix`.
+        """
+        return sum(1 for m, path in self.requests if m == method and path.startswith(prefix))
+
+    # Datarequests.
+
+    def frame(self, query_text: str) -> pd.DataFrame:
+        """
+        Result the server returns for a query, one column per label of its SHOW clause. Honours
+        'date is after' and 'date is within' clauses.
+        """
+        show = re.search(r'\bshow\b(.*?)(?:\bwhen\b|$)', query_text, re.IGNORECASE | re.DOTALL)
+        columns = re.findall(r'(?:^|\n)\s*([^\s:][^:\n]*?):', show.group(1)) if show else []
+        dates = pd.bdate_range(end=self.end_date, periods=self.rows)
+        after = re.search(r'date is after (\d\d/\d\d/\d\d\d\d)', query_text)
+        if after:
+            dates = dates[dates > datetime.strptime(after.group(1), '%m/%d/%Y')]
+        within = re.search(r'date is within (\d+)', query_text)
+        if within:
+            # Any unit is taken as business days.
+            dates = dates[-int(within.group(1)):]
+        values = np.column_stack([self._values(column, len(dates)) for column in columns]) if columns else None
+        return pd.DataFrame(values, index=dates, columns=columns)
+
+    def _values(self, column: str, size: int) -> np.ndarray:
+        rng = np.random.default_rng(zlib.crc32(column.encode()))
+        return np.round(50 + rng.standard_normal(size).cumsum(), 4)
+
+    def datarequest_xml(self, query_text: str) -> bytes:
+        unknown = [x for x in re.findall(r'^\s*(\S+):\s*\1\s*$', query_text, re.MULTILINE)
+                   if self.relation_type(x) is None]
+        if unknown:
+            return f'<DataRequestResponse status="120" statusMsg="Unknown symbol {escape(unknown[0])}"/>'.encode()
+        df = self.frame(query_text)
+        if df.empty:
+            return b'<DataRequestResponse status="130" statusMsg="No data"/>'
+        parts = ['<DataRequestResponse status="100" statusMsg="Complete"><Reports><Report>']
+        parts += [f'<ColumnHeadings>{escape(x)}</ColumnHeadings>' for x in df.columns]
+        for date, row in zip(df.index, df.to_numpy().tolist()):
+            parts.append(f'<RowDates>{date:%Y-%m-%dT%H:%M:%S}</RowDates>')
+            parts += [f'<Values>{x}</Values>' for x in row]
+        parts.append('</Report></Reports></DataRequestResponse>')
+        return ''.join(parts).encode()
+
+    def _submit(self, payload: t.Any) -> int:
+        with self._lock:
+            job_id = next(self._job_ids)
+            self._jobs[job_id] = [self.polls, payload]
+        return job_id
+
+    def _poll(self, job_id: int) -> t.Tuple[bool, t.Any]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return True, None
+            job[0] -= 1
+            return job[0] < 0, job[1]
+
+    def post_datarequest(self, body: bytes) -> bytes:
+        query_text = etree.fromstring(body).findtext('Query/Text')
+        if self.polls:
+            return f'<DataRequestResponse status="200" id="{self._submit(query_text)}"/>'.encode()
+        return self.datarequest_xml(query_text)
+
+    def get_datarequest(self, job_id: int) -> t.Optional[bytes]:
+        done, query_text = self._poll(job_id)
+        if query_text is None:
+            return None
+        if not done:
+            return f'<DataRequestResponse status="200" id="{job_id}"/>'.encode()
+        return self.datarequest_xml(query_text)
+
+    # Schema relations.
+
+    def relation_type(self, name: str) -> t.Optional[str]:
+        if name in self.types:
+            return self.types[name]
+        root, _, code = name.rpartition('_')
+        if self.types.get(root) == 'FUTURES' and len(code) == 5 and code[:4].isdigit():
+            return 'FUTURES'
+        return None
+
+    def children(self, name: str) -> t.List[t.Tuple[str, str]]:
+        if name in self.tree:
+            return self.tree[name]
+        if self.types.get(name) == 'FUTURES':
+            return [(f'{name}_{y}{m}', 'FUTURES') for y in self.contract_years for m in month_codes]
+        return []
+
+    def relations_xml(self, names: t.List[str], params: t.Dict[str, str]) -> t.Optional[bytes]:
+        parts = ['<Relations>']
+        found = False
+        for path in names:
+            name = path.split(':')[-1]
+            type = self.relation_type(name)
+            if type is None:
+                continue
+            found = True
+            children = self.children(name)
+            parts.append(
+                f'<RelationInfo name={quoteattr(name)} type="{type}" hasChildren="{int(bool(children))}" '
+                f'description={quoteattr(f"{name} description")}>'
+            )
+            if params.get('showChildren') == 'true' and children:
+                parts.append('<Children>')
+                parts += [f'<RelationInfo name={quoteattr(c)} type="{ct}"/>' for c, ct in children]
+                parts.append('</Children>')
+            if params.get('dateRange') == 'true' or params.get('showColumns') == 'true':
+                start = self.end_date - pd.offsets.BDay(self.rows - 1)
+                parts.append('<Columns>')
+                for column in ('Close', 'High', 'Low'):
+                    parts.append(
+                        f'<Column cName="{column}"><StartDate>{start:%Y-%m-%d}T00:00:00</StartDate>'
+                        f'<EndDate>{self.end_date:%Y-%m-%d}T00:00:00</EndDate></Column>'
+                    )
+                parts.append('</Columns>')
+            parts.append('</RelationInfo>')
+        parts.append('</Relations>')
+        return ''.join(parts).encode() if found else None
+
+    # Upload.
+
+    def post_upload(self, body: bytes) -> bytes:
+        cells = len(etree.fromstring(body).findall('Rows/Row'))
+        with self._lock:
+            self.uploaded_cells += cells
+        return f'<UploadResponse intStatus="202" jobID="{self._submit(cells)}"/>'.encode()
+
+    def get_jobreport(self, job_id: int) -> t.Optional[bytes]:
+        done, cells = self._poll(job_id)
+        if cells is None:
+            return None
+        code, msg = ('200', f'Loaded {cells} values') if done else ('100', 'Running')
+        return f'<JobReport><status><code>{code}</code><message>{msg}</message></status></JobReport>'.encode()
+
+
+def _handler(server: FakeLim) -> t.Type[BaseHTTPRequestHandler]:
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self._dispatch('GET')
+
+        def do_POST(self):
+            self._dispatch('POST')
+
+        def _dispatch(self, method: str) -> None:
+            url = urlparse(self.path)
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            with server._lock:
+                server.requests.append((method, url.path))
+            if server.latency:
+                time.sleep(server.latency)
+
+            content = None
+            if method == 'POST' and url.path == '/rs/api/datarequests':
+                content = server.post_datarequest(body)
+            elif method == 'GET' and url.path.startswith('/rs/api/datarequests/'):
+                content = server.get_datarequest(int(url.path.rsplit('/', 1)[1]))
+            elif method == 'GET' and url.path.startswith('/rs/api/schema/relations/'):
+                names = unquote(url.path.rsplit('/', 1)[1]).split(',')
+                params = {k: v[0] for k, v in parse_qs(url.query).items()}
+                content = server.relations_xml(names, params)
+            elif method == 'POST' and url.path == '/rs/api/upload':
+                content = server.post_upload(body)
+            elif method == 'GET' and url.path.startswith('/rs/upload/jobreport/'):
+                content = server.get_jobreport(int(url.path.rsplit('/', 1)[1]))
+
+            status = 200 if content is not None else 404
+            content = content if content is not None else b'<Error>Not found</Error>'
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/xml')
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
@@ -0,0 +1,274 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from pylim import core
+from pylim import lim
+
+
+def test_run_many_keeps_order_and_errors():
+    res = core.run_many(lambda x: 1 / x, [1, 0, 4], max_workers=3)
+    assert res[0] == 1
+    assert isinstance(res[1], ZeroDivisionError)
+    assert res[2] == 0.25
+
+
+def test_run_many_rate_limit():
+    start = time.monotonic()
+    core.run_many(lambda x: x, range(5), rate_limit=50)
+    assert time.monotonic() - start >= 4 / 50
+
+
+def test_result_cache_engines(fakelim, tmp_path, monkeypatch):
+    monkeypatch.setitem(core.cache.format_engines, 'parquet', ('no_such_engine',))
+    with pytest.raises(ImportError):
+        core.enable_cache(tmp_path)
+    assert core.get_cache() is None
+
+    def put(key, df):
+        raise OSError('No space left on device')
+
+    result_cache = core.enable_cache(tmp_path, fmt='pickle')
+    try:
+        monkeypatch.setattr(result_cache, 'put', put)
+        assert list(core.query('Show FB: FB').columns) == ['FB']
+    finally:
+        core.disable_cache()
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "feather", "pickle"])
+def test_result_cache_roundtrip(tmp_path, fmt):
+    cache = core.ResultCache(tmp_path, fmt=fmt)
+    df = pd.DataFrame({'FB': [66.25, 68.6]}, index=pd.to_datetime(['2020-01-02', '2020-01-03']))
+    key = cache.key('Show FB: FB')
+    assert cache.key('Show   FB:\nFB') == key
+    assert cache.get(key) is None
+    cache.put(key, df)
+    pd.testing.assert_frame_equal(cache.get(key), df, check_freq=False)
+    assert cache.stats()['hits'] == 1
+    assert cache.stats()['misses'] == 1
+
+
+def test_result_cache_ttl(tmp_path):
+    cache = core.ResultCache(tmp_path, ttl=60, fmt='pickle')
+    key = cache.key('Show FB: FB')
+    cache.put(key, pd.DataFrame({'FB': [1.0]}))
+    os.utime(cache.path(key), (time.time() - 120, time.time() - 120))
+    assert cache.get(key) is None
+
+    # Results of queries such as 'date is within' grow over time, so they expire by default.
+    cache = core.ResultCache(tmp_path, fmt='pickle')
+    assert cache.ttl == core.cache.default_ttl
+    cache.put(key, pd.DataFrame({'FB': [1.0]}))
+    stale = time.time() - core.cache.default_ttl - 1
+    os.utime(cache.path(key), (stale, stale))
+    assert cache.get(key) is None
+
+
+def test_result_cache_lru_eviction(tmp_path):
+    cache = core.ResultCache(tmp_path, fmt='pickle')
+    df = pd.DataFrame({'FB': np.arange(1000.0)})
+    keys = [cache.key(f'Show {x}: {x}') for x in ('FB', 'FP', 'CL')]
+    for i, key in enumerate(keys):
+        cache.put(key, df)
+        os.utime(cache.path(key), (time.time() - 100 + i, time.time()))
+    cache.get(keys[0])
+    cache.evict(cache.size() - 1)
+    assert cache.get(keys[0]) is not None
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[2]) is not None
+
+
+def test_ttl_cache():
+    cache = core.TTLCache(maxsize=2, ttl=60)
+    cache.set('FB', 1)
+    cache.set('FP', 2)
+    cache.get('FB')
+    cache.set('CL', 3)
+    assert cache.get('FP') is None
+    assert cache.get('FB') == 1
+    cache.set('CL', 3, ttl=-1)
+    assert cache.get('CL', 'expired') == 'expired'
+    cache.invalidate(lambda key: key == 'FB')
+    assert len(cache) == 0
+
+
+def test_run_many_retries_and_progress():
+    calls = {}
+    progress = []
+
+    def func(x):
+        calls[x] = calls.get(x, 0) + 1
+        if x == 2 and calls[x] < 3:
+            raise ValueError(x)
+        return x
+
+    res = core.run_many(
+        func, [1, 2, 3], max_workers=1, retries=2, retry_delay=0, progress=lambda *a: progress.append(a),
+    )
+    assert res == [1, 2, 3]
+    assert calls == {1: 1, 2: 3, 3: 1}
+    assert progress == [(1, 3), (2, 3), (3, 3)]
+
+    calls.clear()
+    res = core.run_many(func, [2], retries=0)
+    assert isinstance(res[0], ValueError)
+
+
+RUNNING = b'<DataRequestResponse status="200" id="7"/>'
+DONE = (
+    b'<DataRequestResponse status="100"><Reports><Report><ColumnHeadings>FB</ColumnHeadings>'
+    b'<RowDates>2020-01-02T00:00:00</RowDates><Values>1.5</Values></Report></Reports></DataRequestResponse>'
+)
+
+
+class FakeResponse:
+    def __init__(self, content, headers=None):
+        self.content = content
+        self.headers = headers or {}
+        self.url = 'http://lim/rs/api/datarequests'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FakeSession:
+    def __init__(self, polls_until_done):
+        self.polls_until_done = polls_until_done
+        self.posts, self.gets = 0, 0
+
+    def post(self, url, **kwargs):
+        self.posts += 1
+        return FakeResponse(RUNNING)
+
+    def get(self, url, **kwargs):
+        self.gets += 1
+        return FakeResponse(DONE if self.gets >= self.polls_until_done else RUNNING, {'Retry-After': '0'})
+
+
+def test_polling_strategy():
+    polling = core.PollingStrategy(initial_delay=1, max_delay=5, multiplier=2, jitter=0)
+    assert [polling.delay(i) for i in range(4)] == [1, 2, 4, 5]
+    assert polling.delay(0, retry_after=3) == 3
+    assert polling.delay(0, retry_after=30) == 5
+    assert core.PollingStrategy(jitter=0.5).delay(0) == pytest.approx(0.2, rel=0.5)
+
+
+def test_submit_and_attach():
+    polling = core.PollingStrategy(initial_delay=0.01, jitter=0, deadline=0.05, honour_retry_after=False)
+    session = FakeSession(polls_until_done=100)
+    job = core.submit('Show FB: FB', session=session, polling=polling)
+    assert job.job_id == 7 and not job.done()
+    with pytest.raises(core.JobTimeoutError) as e:
+        job.result()
+    assert e.value.job_id == 7
+
+    session.polls_until_done = session.gets + 2
+    job = core.attach(e.value.job_id, session=session, polling=polling)
+    assert job.status() == 'running'
+    df = job.result(timeout=1)
+    assert df['FB'].tolist() == [1.5]
+    assert job.status() == 'done'
+    assert session.posts == 1
+
+
+def test_instrumentation(fakelim, monkeypatch):
+    monkeypatch.setattr(core.data, 'polling', core.PollingStrategy(initial_delay=0.01, jitter=0))
+    assert core.instrumentation.start('query') is None
+    records = []
+    hook = core.instrumentation.add_hook(records.append)
+    try:
+        fakelim.polls = 2
+        core.query('Show FB: FB')
+        with pytest.raises(requests.HTTPError):
+            lim.relations('UNKNOWN')
+        lim.relations('FB', 'FP', use_cache=False)
+        with core.instrumentation.measure('resample') as measured:
+            assert measured is not None
+    finally:
+        core.instrumentation.remove_hook(hook)
+    with core.instrumentation.measure('resample') as measured:
+        assert measured is None
+
+    record = records[0]
+    assert record.kind == 'query' and record.job_id is not None
+    assert record.polls == 3 and record.poll >= record.poll_wait > 0
+    assert record.download_bytes > 0 and record.parse > 0 and record.build > 0
+    assert record.total >= record.submit + record.poll
+    assert record.query_hash == core.instrumentation.query_hash('Show FB: FB')
+    assert records[1].kind == 'relations' and records[1].error.startswith('HTTPError')
+    assert records[2].kind == 'relations' and records[2].error is None and records[2].download_bytes > 0
+    assert records[2].parse > 0 and records[2].total >= records[2].submit
+    assert records[3].kind == 'resample' and len(records) == 4
+
+
+def test_single_flight():
+    flights = core.singleflight.SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def func():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return [1]
+
+    with ThreadPoolExecutor(4) as executor:
+        leader = executor.submit(flights.do, 'key', func, copy=list)
+        started.wait(5)
+        followers = [executor.submit(flights.do, 'key', func, copy=list) for _ in range(3)]
+        while flights.stats()['coalesced'] < 3:
+            time.sleep(0.01)
+        release.set()
+        results = [leader.result()] + [x.result() for x in followers]
+
+    assert len(calls) == 1
+    assert results == [[1]] * 4
+    assert len({id(x) for x in results}) == 4
+    assert flights.do('key', lambda: 2) == 2
+
+
+def test_query_coalescing(fakelim, tmp_path, monkeypatch):
+    fakelim.latency = 0.2
+    result_cache = core.enable_cache(tmp_path, fmt='pickle')
+    puts = []
+    put = result_cache.put
+    monkeypatch.setattr(result_cache, 'put', lambda key, df: puts.append(key) or put(key, df))
+    try:
+        results = core.run_many(lambda _: core.query('Show FB: FB'), range(4), max_workers=4)
+    finally:
+        core.disable_cache()
+    assert fakelim.count('POST', '/rs/api/datarequests') == 1 and len(puts) == 1
+    assert all(x.equals(results[0]) for x in results) and len({id(x) for x in results}) == 4
+
+    results = core.run_many(lambda _: lim.relations('FB', 'FP', use_cache=False), range(4), max_workers=4)
+    assert fakelim.count('GET', '/rs/api/schema/relations/') == 1
+
+
+def test_request_batcher():
+    batches = []
+
+    def execute(key, items):
+        batches.append((key, items))
+        return [ValueError(x) if x < 0 else x * 10 for x in items]
+
+    with core.RequestBatcher(execute, max_size=3) as batcher:
+        futures = [batcher.submit(k, x) for k, x in [('a', 1), ('b', 2), ('a', -3), ('a', 4), ('a', 5)]]
+        assert len(batches) == 1 and futures[0].result() == 10
+    assert sorted(batches) == [('a', [1, -3, 4]), ('a', [5]), ('b', [2])]
+    assert [futures[i].result() for i in (1, 3, 4)] == [20, 40, 50]
+    with pytest.raises(ValueError):
+        futures[2].result()
+
+    batcher = core.RequestBatcher(execute, window=0.05)
+    futures = [batcher.submit('a', x) for x in (1, 2)]
+    assert [x.result(timeout=5) for x in futures] == [10, 20] and batches[-1] == ('a', [1, 2])
@@ -0,0 +1,58 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pylim import limformula
+
+
+def test_compile_formula():
+    f = limformula.compile_formula('Show 1: FP/7.45-FB + FP')
+    assert f.symbols == ('FP', 'FB')
+    assert limformula.compile_formula('Show 1: FP/7.45-FB + FP') is f
+
+
+def test_evaluate_frame():
+    df = pd.DataFrame({'FP': [745.0, 1490.0], 'FB': [50.0, 60.0]}, index=pd.date_range('2020-01-01', periods=2))
+    res = limformula.compile_formula('Show 1: FP/7.45-FB').evaluate(df)
+    pd.testing.assert_series_equal(res, pd.Series([50.0, 140.0], index=df.index))
+
+
+def test_evaluate_power_and_columns():
+    df = pd.DataFrame({'CL_1': [2.0, 3.0], 'PUMFE.2': [1.0, -1.0]})
+    f = limformula.compile_formula('Show 1: -(CL ^ 2) + PUMFE.2')
+    res = f.evaluate(df, columns={'CL': 'CL_1'})
+    assert list(res) == [-3.0, -10.0]
+
+
+def test_evaluate_constant_and_mapping():
+    df = pd.DataFrame({'FB': [1.0, 2.0, 3.0]})
+    assert list(limformula.compile_formula('Show 1: 2*3').evaluate(df)) == [6.0, 6.0, 6.0]
+    res = limformula.compile_formula('FB/0').evaluate({'FB': [1.0, 0.0]})
+    assert np.isinf(res[0]) and np.isnan(res[1])
+
+
+def test_evaluate_result_is_writable():
+    df = pd.DataFrame({'A': [1.0, 2.0], 'B': [0.5, 0.5]})
+    for formula in ('A-B', 'A', '2*3'):
+        res = limformula.compile_formula(formula).evaluate(df)
+        res.iloc[0] = 9
+        res += 1
+        assert res.iloc[0] == 10
+    assert df['A'].tolist() == [1.0, 2.0]
+
+    values = np.array([1.0, 2.0])
+    res = limformula.compile_formula('A').evaluate({'A': values})
+    res[0] = 9
+    assert values[0] == 1.0
+
+
+@pytest.mark.parametrize('formula', [
+    'Show 1: FB[0]',
+    'Show 1: FB < 1',
+    'Show 1: FB(1)',
+    'Show 1: FB if FB else 1',
+    'Show 1: "FB" + 1',
+])
+def test_unsupported_formula(formula):
+    with pytest.raises((ValueError, SyntaxError)):
+        limformula.compile_formula(formula)
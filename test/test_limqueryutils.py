@@ -1,6 +1,8 @@
 import pandas as pd
+import pytest
 
 from pylim import limqueryutils
+from pylim import limutils
 
 
 def test_build_futures_contracts_formula_query():
@@ -47,3 +49,55 @@ def test_build_build_curve_query_mix_types():
     assert 'ATTR @GBPUSD = if GBPUSD is defined then GBPUSD else GBPUSD on previous {GBPUSD is defined} ENDIF' in res
     assert '1: @FP/7.45-@FB + 0' in res
 
+
+
+@pytest.mark.parametrize(
+    "query, candidates",
+    [
+        ('Show 1: FP/7.45-FB + GBPUSD', ['FP', 'FB', 'GBPUSD']),
+        ('Show \r\nFB: FB FP: FP when date is after 2019', ['FB', 'FP']),
+        ('Show Close: Close of FB High: High of FB when date is within 10 days', ['FB']),
+        ('LET FP_M2 = FP(ROLLOVER_DATE = "5 days before expiration day") SHOW FP_02: FP_M2', ['FP', 'FP_M2']),
+        ('LET ATTR @FB = forward_curve(FB,"Close","LAST","","","days","",0 day ago) SHOW FB: @FB', ['FB']),
+        ('Show 1: (PA0002779.6.2 - PUMFE03) * 2', ['PA0002779.6.2', 'PUMFE03']),
+        ('Show 1: FB - 1e5 + 2.5E-3 * 3.', ['FB']),
+        ('%exec.days("x") Show FB: FB', ['FB']),
+    ]
+)
+def test_find_symbol_candidates(query, candidates):
+    assert limqueryutils.find_symbol_candidates(query) == candidates
+
+
+def test_build_curve_formula_history_query():
+    matches = {'FP': 'FUTURES', 'FB': 'FUTURES'}
+    curve_dates = (pd.to_datetime('2020-02-02'), pd.to_datetime('2020-04-04'))
+    res = limqueryutils.build_curve_formula_history_query('Show 1: FP/7.45-FB', matches, curve_dates)
+    assert 'ATTR @FP_2 = forward_curve(FP,"Close","04/04/2020","","","days","",0 day ago)' in res
+    assert '2020/02/02: @FP_1/7.45-@FB_1' in res
+    assert '2020/04/04: @FP_2/7.45-@FB_2' in res
+
+
+def test_build_curve_formula_history_query_mix_types():
+    matches = {'FP': 'FUTURES', 'FB': 'FUTURES', 'GBPUSD': 'NORMAL'}
+    curve_dates = (pd.to_datetime('2020-02-02'), pd.to_datetime('2020-04-04'))
+    res = limqueryutils.build_curve_formula_history_query('Show 1: FP/7.45-FB + GBPUSD', matches, curve_dates)
+    assert 'GBPUSD: @GBPUSD' in res
+    assert 'FB_2: @FB_2' in res
+    assert '2020/02/02' not in res
+
+
+def test_substitute_symbols():
+    res = limqueryutils.substitute_symbols('FP/7.45-FB + NYMEX.FB * FB_2020F', {'FB': '@FB', 'FP': '@FP'})
+    assert res == '@FP/7.45-@FB + NYMEX.FB * FB_2020F'
+
+
+def test_build_series_query_metadata():
+    starts = {'Close': '2011-01-31', 'High': '1979-09-03', 'Low': '1979-09-03'}
+    columns = {k: limutils.ColumnRange(pd.Timestamp(v), pd.Timestamp('2020-12-31')) for k, v in starts.items()}
+    info = limutils.RelationInfo('PJABA00', 'NORMAL', {}, columns=columns)
+    expected = 'Show\nFB: FB\nPJABA00: (High of PJABA00 + Low of PJABA00)/2'
+    assert limqueryutils.build_series_query(('FB', 'PJABA00'), {'PJABA00': info}) == expected
+
+    frame = limutils.relations_frame([info], date_range=True)
+    assert limqueryutils.build_series_query(('FB', 'PJABA00'), frame) == expected
+    assert limqueryutils.build_series_query(('PJABA00',), {}) == 'Show\nPJABA00: PJABA00'
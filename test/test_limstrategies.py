@@ -85,3 +85,17 @@ def test_fly2():
     res = limstrategies.fly('Show 1: FP/7.45-FB', x=1, y=2, z=3, start_year=2019, end_year=2020,
                             start_date='2019-01-01')
     assert res[2020]['2019-01-02'] == pytest.approx(0.023, abs=0.01)
+
+
+def test_contract_panel_downloads_once(monkeypatch):
+    columns = [f'{y}{m}' for y in (2020, 2021) for m in 'FGHJKMNQUVXZ']
+    df = pd.DataFrame([range(len(columns))], index=pd.to_datetime(['2020-01-02']), columns=columns, dtype=float)
+    calls = []
+    monkeypatch.setattr(limstrategies.lim, 'contracts', lambda *args, **kwargs: calls.append(args) or df)
+
+    panel = limstrategies.ContractPanel('FP', start_year=2020)
+    assert panel.quarterly()['Q2_2021']['2020-01-02'] == pytest.approx(16)
+    assert panel.calendar()[2020]['2020-01-02'] == pytest.approx(5.5)
+    assert panel.spread(6, 12)[2020]['2020-01-02'] == pytest.approx(-6)
+    assert panel.multi_spread([[1, 2]])['JanFeb_2021']['2020-01-02'] == pytest.approx(-1)
+    assert len(calls) == 1
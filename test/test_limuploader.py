@@ -3,6 +3,7 @@ from datetime import date
 from datetime import timedelta
 
 import pytest
+from lxml import etree
 
 from pylim import lim
 from pylim import limuploader
@@ -29,3 +30,41 @@ def test_upload_series():
     # Assert
     assert download_df.loc[f"{today:%Y-%m-%d}"]['SPOTPRICE1'] == pytest.approx(spot_price1)
     assert download_df.loc[f"{today:%Y-%m-%d}"]['SPOTPRICE2'] == pytest.approx(spot_price2)
+
+
+def test_build_upload_xml():
+    df = pd.DataFrame(
+        {'TopRelation:Test:A;TopColumn:Price:Close': [1.5, float('nan')], 'TopRelation:Test:B&C': [2.0, 3.25]},
+        index=pd.to_datetime(['2020-01-01', '2020-01-02 12:00']),
+    )
+    xml = limuploader.build_upload_xml(df, {'description': 'a < b'})
+    rows = etree.fromstring(xml).find('Rows')
+    cells = [[col.text for col in row.iter('Col')] for row in rows]
+    assert [row.get('num') for row in rows] == ['1', '2', '3']
+    assert cells == [
+        ['TopRelation:Test:A', 'TopColumn:Price:Close', '43831', '1.5', 'a < b'],
+        ['TopRelation:Test:B&C', limuploader.default_column, '43831', '2.0', 'a < b'],
+        ['TopRelation:Test:B&C', limuploader.default_column, '43832', '3.25', 'a < b'],
+    ]
+
+
+@pytest.mark.parametrize(
+    "columns, values",
+    [
+        ({'A': [1, 2]}, ['1', '2']),
+        ({'A': [1, 2], 'B': [0.5, float('nan')]}, ['1.0', '0.5', '2.0']),
+        ({'A': [1.0, 2.0]}, ['1.0', '2.0']),
+    ]
+)
+def test_build_upload_xml_value_format(columns, values):
+    # Same text as the element tree builder this replaced, which formatted each iterrows value.
+    df = pd.DataFrame(columns, index=pd.to_datetime(['2020-01-01', '2020-01-02']))
+    xml = limuploader.build_upload_xml(df, {})
+    assert [x.text for x in etree.fromstring(xml).iter('Col') if x.get('num') == '4'] == values
+
+
+def test_chunks_by_cells():
+    df = pd.DataFrame({'A': [float('nan'), 1, 1, 1, 1], 'B': [1, 1, 1, 1, 1]})
+    assert [len(x) for x in limuploader.chunks_by_cells(df, 3)] == [2, 1, 1, 1]
+    assert [len(x) for x in limuploader.chunks_by_cells(df, 1)] == [1, 1, 1, 1, 1]
+    assert [len(x) for x in limuploader.chunks_by_cells(df, 100, max_rows=2)] == [2, 2, 1]
@@ -1,4 +1,9 @@
+import io
+
+import numpy as np
+import pandas as pd
 import pytest
+from lxml import etree
 
 from pylim import limutils
 
@@ -14,3 +19,101 @@ from pylim import limutils
 )
 def test_pra_symbol(symbol: str, result: bool):
     assert limutils.check_pra_symbol(symbol) == result
+
+
+XML_REPORTS = (
+    '<Reports><Report>'
+    '<ColumnHeadings>FB</ColumnHeadings><ColumnHeadings>FP</ColumnHeadings>'
+    '<RowDates>2020-01-02T00:00:00</RowDates><Values>66.25</Values><Values>608.5</Values>'
+    '<RowDates>2020-01-03T00:00:00</RowDates><Values>68.6</Values><Values>624.25</Values>'
+    '</Report></Reports>'
+)
+
+
+def test_build_dataframe():
+    res = limutils.build_dataframe(etree.fromstring(XML_REPORTS))
+    assert list(res.columns) == ['FB', 'FP']
+    assert res['FP']['2020-01-03'] == 624.25
+    assert res.index[0] == pd.Timestamp('2020-01-02')
+
+    res = limutils.build_dataframe(etree.fromstring(XML_REPORTS), dtype=np.float32)
+    assert res['FB'].dtype == np.float32
+
+
+def test_iterparse_response():
+    content = f'<DataRequestResponse status="100">{XML_REPORTS}</DataRequestResponse>'.encode()
+    attrib, res = limutils.iterparse_response(io.BytesIO(content))
+    assert attrib['status'] == '100'
+    pd.testing.assert_frame_equal(res, limutils.build_dataframe(etree.fromstring(XML_REPORTS)))
+
+    attrib, res = limutils.iterparse_response(io.BytesIO(b'<DataRequestResponse status="200" id="12"/>'))
+    assert attrib['id'] == '12'
+    assert res is None
+
+
+CONTRACTS = ['FB_2019Z', 'FB_2020F', 'FB_2020G', 'FB_2021H', 'FBX_2020F', 'FP_2020F', 'FP_2020G', 'FB_2020Q1']
+
+
+@pytest.mark.parametrize('kwargs, expected', [
+    ({'start_year': 2020, 'end_year': 2020}, ['FB_2020F', 'FB_2020G', 'FBX_2020F', 'FP_2020F', 'FP_2020G', 'FB_2020Q1']),
+    ({'months': ['F']}, ['FB_2020F', 'FBX_2020F', 'FP_2020F']),
+    ({'months': ['Q1'], 'start_year': 2021}, ['FB_2021H']),
+    ({'months': ['CAL19']}, ['FB_2019Z']),
+])
+def test_filter_contracts(kwargs, expected):
+    assert limutils.filter_contracts(CONTRACTS, **kwargs) == expected
+
+
+def test_contract_index():
+    index = limutils.ContractIndex(CONTRACTS)
+    assert index.for_root('FB').tolist() == ['FB_2019Z', 'FB_2020F', 'FB_2020G', 'FB_2021H', 'FB_2020Q1']
+    assert index.common_codes(('FB', 'FP')) == ['2020F', '2020G']
+    assert index.common_codes(('FB', 'FBX')) == ['2020F']
+    assert list(index.years) == [2019, 2020, 2020, 2021, 2020, 2020, 2020, 2020]
+    assert index.months[-1] == ''
+
+
+def test_contract_pivots():
+    columns = ['2021F', '2020G', '2020F', '2020J']
+    df = pd.DataFrame([[1.0, 2.0, 4.0, np.nan]], columns=columns)
+    df = limutils.convert_lim_contracts_to_datetime(df)
+    assert list(df.columns) == list(pd.to_datetime(['2020-01-01', '2020-02-01', '2020-04-01', '2021-01-01']))
+    assert limutils.pivots_contract_by_year(df).iloc[0].to_dict() == {2020: 3.0, 2021: 1.0}
+    res = limutils.pivots_contract_by_quarter(df)
+    assert list(res.columns) == ['Q1_2020', 'Q1_2021', 'Q2_2020']
+    assert list(res.iloc[0])[:2] == [3.0, 1.0] and np.isnan(res.iloc[0, 2])
+
+
+XML_RELATIONS = (
+    '<Relations>'
+    '<RelationInfo name="FB" type="FUTURES" hasChildren="1"><Children>'
+    '<RelationInfo name="FB_2020F" type="FUTURES"/><RelationInfo name="FB_2020G" type="FUTURES"/>'
+    '</Children><Columns>'
+    '<Column cName="Close"><StartDate>1988-06-23T00:00:00</StartDate><EndDate>2020-12-31T00:00:00</EndDate></Column>'
+    '<Column cName="Low"><StartDate>1990-01-02T00:00:00</StartDate><EndDate>2020-12-31T00:00:00</EndDate></Column>'
+    '</Columns></RelationInfo>'
+    '<RelationInfo name="GBPUSD" type="NORMAL" hasChildren="0" description="Cable"><Columns/></RelationInfo>'
+    '</Relations>'
+)
+
+
+def test_parse_relations():
+    root = etree.fromstring(XML_RELATIONS)
+    fb, cable = limutils.parse_relations(root, show_children=True, date_range=True)
+    assert (fb.name, fb.type, fb.has_children) == ('FB', 'FUTURES', True)
+    assert fb.children == [('FB_2020F', 'FUTURES'), ('FB_2020G', 'FUTURES')]
+    assert fb.columns['Low'] == (pd.Timestamp('1990-01-02'), pd.Timestamp('2020-12-31'))
+    assert cable.children is None and cable.columns == {} and cable.attrib['description'] == 'Cable'
+    assert limutils.parse_relations(root)[0].columns is None
+
+    df = limutils.relations_frame([fb, cable], show_children=True, date_range=True)
+    assert list(df.columns) == ['FB', 'GBPUSD']
+    assert list(df.index) == ['name', 'type', 'hasChildren', 'description', 'children', 'daterange']
+    assert list(df['FB']['children']['name']) == ['FB_2020F', 'FB_2020G'] and pd.isna(df['GBPUSD']['children'])
+    assert df['FB']['daterange'].start.Close == pd.Timestamp('1988-06-23') and df['GBPUSD']['daterange'].empty
+    assert pd.isna(df['FB']['description'])
+
+    base = df.iloc[:4].copy()
+    res = limutils.relinfo_daterange(limutils.relinfo_children(base, root), root)
+    assert list(res.index) == list(df.index)
+    assert res['FB']['daterange'].equals(df['FB']['daterange'])
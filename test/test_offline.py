@@ -0,0 +1,246 @@
+"""
+End to end tests of the query, relations, crawl, upload and async paths against the local LIM stand-in.
+"""
+import asyncio
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+import pytest
+import requests
+
+from pylim import core
+from pylim import lim
+from pylim import limasync
+from pylim import limuploader
+
+
+def test_query(fakelim):
+    df = core.query('Show\nFB: FB\nFP: FP')
+    assert list(df.columns) == ['FB', 'FP']
+    assert len(df) == fakelim.rows
+    pd.testing.assert_frame_equal(df, fakelim.frame('Show\nFB: FB\nFP: FP'), check_freq=False)
+
+
+def test_query_polling(fakelim):
+    fakelim.polls = 3
+    polling = core.PollingStrategy(initial_delay=0.01, jitter=0)
+    job = core.submit('Show FB: FB', polling=polling)
+    assert job.job_id is not None
+    assert job.result()['FB'].tolist() == fakelim.frame('Show FB: FB')['FB'].tolist()
+    assert fakelim.count('GET', '/rs/api/datarequests/') == 4
+
+
+def test_query_stream(fakelim):
+    df = core.query('Show FB: FB', stream=True)
+    pd.testing.assert_frame_equal(df, core.query('Show FB: FB'))
+
+
+def test_series(fakelim):
+    df = lim.series({'FB': 'Brent', 'GBPUSD': 'Cable'})
+    assert list(df.columns) == ['Brent', 'Cable']
+    assert len(df) == fakelim.rows
+
+
+def test_series_incremental(fakelim, tmp_path):
+    core.enable_cache(tmp_path)
+    try:
+        first = lim.series('FB', incremental=True)
+        fakelim.end_date += pd.offsets.BDay(5)
+        second = lim.series('FB', incremental=True)
+    finally:
+        core.disable_cache()
+    assert len(second) == len(first) + 5
+    assert second.index[-1] == fakelim.end_date
+
+
+def test_series_incremental_coverage(fakelim, tmp_path):
+    core.enable_cache(tmp_path)
+    try:
+        recent = lim.series('FB', start_date='2020-12-01', incremental=True)
+        full = lim.series('FB', incremental=True)
+        posts = fakelim.count('POST', '/rs/api/datarequests')
+        again = lim.series('FB', incremental=True)
+        later = lim.series('FB', start_date='2020-06-01', incremental=True)
+    finally:
+        core.disable_cache()
+    assert len(recent) == 23 and len(full) == fakelim.rows
+    assert len(again) == fakelim.rows and later.index[0] == pd.Timestamp('2020-06-01')
+    # The full history covers both later calls, which only ask LIM for the last few days.
+    assert fakelim.count('POST', '/rs/api/datarequests') == posts + 2
+    assert lim._history_start('date is within 2 weeks', now=date(2021, 1, 15)) == pd.Timestamp('2021-01-01')
+
+
+def test_series_incremental_unknown_window(fakelim, tmp_path):
+    result_cache = core.enable_cache(tmp_path)
+    try:
+        full = lim.series('FB', incremental=True)
+        window = lim.series('FB', start_date='date is within 10 business days', incremental=True)
+        stored = result_cache.load('series:FB')
+        posts = fakelim.count('POST', '/rs/api/datarequests')
+        again = lim.series('FB', incremental=True)
+    finally:
+        core.disable_cache()
+    assert len(full) == fakelim.rows and len(window) == 10
+    # The window is merged into the stored history rather than replacing it.
+    assert len(stored) == fakelim.rows and len(again) == fakelim.rows
+    assert fakelim.count('POST', '/rs/api/datarequests') == posts + 1
+
+
+def test_relations(fakelim):
+    df = lim.relations('FB', 'GBPUSD', 'UNKNOWN', show_children=True)
+    assert sorted(df.columns) == ['FB', 'GBPUSD']
+    assert df['FB']['type'] == 'FUTURES'
+    assert len(df['FB']['children']) == 12 * len(fakelim.contract_years)
+
+    lim.relations('FB', 'GBPUSD', 'UNKNOWN', show_children=True)
+    assert fakelim.count('GET', '/rs/api/schema/relations/') == 1
+
+
+def test_relations_unknown_names(fakelim):
+    assert lim.find_symbols_in_query('Show 1: FB + GBPUSD') == {'FB': 'FUTURES', 'GBPUSD': 'NORMAL'}
+    assert lim.find_symbols_in_query('Show 1: XYZ + FB') == {'FB': 'FUTURES'}
+    assert list(lim.relation_info('XYZ', 'GBPUSD')) == ['GBPUSD']
+    for _ in range(2):
+        with pytest.raises(requests.HTTPError) as e:
+            lim.relations('XYZ', 'UNKNOWN')
+        assert e.value.response.status_code == 404
+
+
+def test_relations_disk_cache(fakelim, monkeypatch, tmp_path):
+    monkeypatch.setattr(lim, 'relations_disk_cache', None)
+    lim.enable_relations_disk_cache(tmp_path)
+    df = lim.relations('FB', 'GBPUSD', show_children=True)
+    lim.relations_cache.invalidate()
+    info = lim.relation_info('FB', show_children=True)['FB']
+    assert fakelim.count('GET', '/rs/api/schema/relations/') == 1
+    assert info.children == list(zip(df['FB']['children']['name'], df['FB']['children']['type']))
+
+
+def test_find_symbols_in_path(fakelim):
+    assert sorted(lim.find_symbols_in_path('TopRelation')) == ['CL', 'FB', 'FP', 'GBPUSD', 'HO', 'PUMFE03']
+    assert sorted(lim.find_symbols_in_path('TopRelation:Futures', type='FUTURES')) == ['CL', 'FB', 'FP', 'HO']
+
+
+def test_iter_symbols_in_path_resume(fakelim, tmp_path):
+    state_file = str(tmp_path / 'crawl.json')
+    crawl = lim.iter_symbols_in_path('TopRelation', batch_size=1, max_workers=2, state_file=state_file)
+    first = [next(crawl) for _ in range(2)]
+    crawl.close()
+    rest = list(lim.iter_symbols_in_path('TopRelation', batch_size=1, max_workers=2, state_file=state_file))
+    assert set(first + rest) == {'CL', 'FB', 'FP', 'GBPUSD', 'HO', 'PUMFE03'}
+    assert not os.path.exists(state_file)
+
+
+def test_contracts(fakelim):
+    df = lim.contracts('Show 1: FB - FP', start_year=2020, end_year=2021, chunk_size=5)
+    assert len(df.columns) == 24
+    assert list(df.columns[:2]) == ['2020F', '2020G']
+    assert lim.get_symbol_contract_list('FB', monthly_contracts_only=True)[0] == 'FB_2018F'
+
+    for _ in range(2):
+        lists = lim.get_contract_lists('FB')
+        assert len(lists['FB']) == 12 * len(fakelim.contract_years)
+        lists['FB'].remove('FB_2018F')
+        lists['FB'].sort(reverse=True)
+    assert lim.get_contract_lists('FB')['FB'][0] == 'FB_2018F'
+
+
+def test_curve_formula(fakelim):
+    curve_dates = (date(2020, 1, 2), date(2020, 2, 3))
+    df = lim.curve_formula('Show 1: FB - GBPUSD', curve_dates=curve_dates)
+    assert list(df.columns) == ['2020/01/02', '2020/02/03']
+    assert not df.isna().all().any()
+
+
+def test_upload_series(fakelim, monkeypatch):
+    fakelim.polls = 2
+    monkeypatch.setattr(limuploader, 'polling', core.PollingStrategy(initial_delay=0.01, jitter=0))
+    df = pd.DataFrame(np.ones((10, 3)), index=pd.bdate_range('2020-01-01', periods=10), columns=['A', 'B', 'C'])
+    results = limuploader.upload_series(df, {'description': 'test'}, max_chunk_cells=12)
+    assert [x.cells for x in results] == [12, 12, 6]
+    assert all(x.ok for x in results)
+    assert fakelim.uploaded_cells == 30
+
+    submit_chunk = limuploader.submit_chunk
+
+    def failing_submit(session, chunk, dfmeta, chunk_id):
+        if chunk_id == 2:
+            raise requests.ConnectionError('connection reset')
+        return submit_chunk(session, chunk, dfmeta, chunk_id)
+
+    monkeypatch.setattr(limuploader, 'submit_chunk', failing_submit)
+    results = limuploader.upload_series(df, {'description': 'test'}, max_chunk_cells=12)
+    assert [x.ok for x in results] == [True, False, True]
+    assert isinstance(results[1].error, requests.ConnectionError) and results[1].code is None
+    assert fakelim.uploaded_cells == 48
+
+
+def test_async(fakelim):
+    fakelim.polls = 1
+
+    async def main():
+        async with core.AsyncClient(server=fakelim.url, username='user', password='secret') as client:
+            return await asyncio.gather(
+                limasync.aseries('FB', client=client), limasync.aseries('FP', client=client),
+                limasync.arelations('FB', client=client),
+            )
+
+    fb, fp, rel = asyncio.run(main())
+    assert list(fb.columns) == ['FB'] and list(fp.columns) == ['FP']
+    assert rel['FB']['type'] == 'FUTURES'
+
+
+def test_async_relations(fakelim):
+    fakelim.latency = 0.1
+
+    async def main():
+        async with core.AsyncClient(server=fakelim.url, username='user', password='secret') as client:
+            frames = await asyncio.gather(*(limasync.arelations('FP', 'HO', client=client) for _ in range(3)))
+            frames.append(await limasync.arelations('FP', 'HO', client=client))
+            with pytest.raises(requests.HTTPError) as e:
+                await limasync.arelations('XYZ', use_cache=False, client=client)
+            return frames, e.value
+
+    frames, error = asyncio.run(main())
+    assert fakelim.count('GET', '/rs/api/schema/relations/') == 2
+    assert all(sorted(x.columns) == ['FP', 'HO'] for x in frames)
+    assert error.response.status_code == 404
+    assert lim.relation_info('FP')['FP'].type == 'FUTURES'
+    assert fakelim.count('GET', '/rs/api/schema/relations/') == 2
+
+
+def test_series_batch(fakelim):
+    with lim.batch():
+        fb, both, cable = lim.series('FB'), lim.series(('FB', 'FP')), lim.series({'GBPUSD': 'Cable'})
+        later = lim.series('CL', start_date='2020-12-01')
+    assert fakelim.count('POST', '/rs/api/datarequests') == 2
+    assert list(fb.result().columns) == ['FB'] and list(both.result().columns) == ['FB', 'FP']
+    assert list(cable.result().columns) == ['Cable'] and len(cable.result()) == fakelim.rows
+    assert later.result().index[0] == pd.Timestamp('2020-12-01')
+    pd.testing.assert_frame_equal(fb.result(), lim.series('FB'), check_freq=False)
+
+    with lim.batch():
+        good, bad = lim.series('FB'), lim.series('UNKNOWN')
+    assert list(good.result().columns) == ['FB']
+    with pytest.raises(Exception):
+        bad.result()
+
+
+def test_series_batch_no_data(fakelim):
+    with lim.batch():
+        fb, fp = lim.series('FB', start_date='2021-06-01'), lim.series('FP', start_date='2021-06-01')
+    for future in (fb, fp):
+        assert future.result().empty
+        pd.testing.assert_frame_equal(future.result(), lim.series('FB', start_date='2021-06-01'))
+
+
+def test_series_batching_window(fakelim):
+    lim.enable_series_batching(window=0.1)
+    try:
+        results = core.run_many(lim.series, ['FB', 'FP', 'CL', 'HO'], max_workers=4)
+    finally:
+        lim.disable_series_batching()
+    assert fakelim.count('POST', '/rs/api/datarequests') == 1
+    assert [list(x.columns) for x in results] == [['FB'], ['FP'], ['CL'], ['HO']]